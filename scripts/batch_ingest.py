@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Upload many documents to LightRAG with ordering, backpressure and retries.
+
+- orders files by size or estimated chunk count (text: token estimate;
+  PDF: page count x --tokens-per-page, file size when the page count is
+  unavailable)
+- keeps at most --max-in-flight documents pending/processing on the server,
+  using /documents/status_counts and the pipeline busy state as backpressure
+- follows each upload through /documents/track_status/{track_id}
+- deletes and re-uploads failed documents up to --max-retries times
+- skips files the server already holds ("duplicated" on first upload)
+- writes a JSON report with per-document timings and overall throughput
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import mimetypes
+import time
+import urllib.parse
+import urllib.request
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+
+from extract_pdf_text import page_count
+from ingest_progress import IngestProgressTracker, PipelineStalledError, api_json
+from token_estimate import estimate_tokens
+
+TEXT_EXTENSIONS = {".txt", ".md", ".csv", ".json"}
+
+
+@dataclass
+class IngestJob:
+    path: str
+    size: int
+    est_chunks: int
+    attempts: int = 0
+    state: str = "queued"
+    track_id: str = ""
+    doc_id: str = ""
+    uploaded_at: float = 0.0
+    finished_at: float = 0.0
+    chunks_count: int = 0
+    error: str = ""
+
+
+def upload_file(base_url: str, file_path: Path, data: bytes | None = None, filename: str | None = None) -> dict:
+    boundary = "----LightRAGBoundary7MA4YWxkTrZu0gW"
+    name = filename or file_path.name
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    payload = file_path.read_bytes() if data is None else data
+    header = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{name}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+    req = urllib.request.Request(
+        f"{base_url.rstrip('/')}/documents/upload",
+        data=header + payload + tail,
+        method="POST",
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    with urllib.request.urlopen(req, timeout=300) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def estimate_chunks(path: Path, chunk_size: int, bytes_per_chunk: int, tokens_per_page: int) -> int:
+    if path.suffix.lower() in TEXT_EXTENSIONS:
+        text = path.read_text(encoding="utf-8", errors="replace")
+        return max(1, math.ceil(estimate_tokens(text) / chunk_size))
+    if path.suffix.lower() == ".pdf":
+        # File size mostly measures embedded drawings and fonts; pages track the text.
+        try:
+            return max(1, math.ceil(page_count(str(path)) * tokens_per_page / chunk_size))
+        except Exception:  # no PDF library, or an unreadable PDF: fall back to size
+            pass
+    return max(1, math.ceil(path.stat().st_size / bytes_per_chunk))
+
+
+def collect_jobs(
+    src_dir: Path,
+    patterns: list[str],
+    order: str,
+    chunk_size: int,
+    bytes_per_chunk: int,
+    tokens_per_page: int,
+) -> list[IngestJob]:
+    paths = sorted({p for pattern in patterns for p in src_dir.glob(pattern) if p.is_file()})
+    jobs = [
+        IngestJob(
+            path=str(p),
+            size=p.stat().st_size,
+            est_chunks=estimate_chunks(p, chunk_size, bytes_per_chunk, tokens_per_page),
+        )
+        for p in paths
+    ]
+    key, _, direction = order.partition("-")
+    field = "size" if key == "size" else "est_chunks"
+    jobs.sort(key=lambda j: getattr(j, field), reverse=direction == "desc")
+    return jobs
+
+
+class BatchIngestScheduler:
+    def __init__(
+        self,
+        base_url: str,
+        max_in_flight: int = 2,
+        max_retries: int = 2,
+        tracker: IngestProgressTracker | None = None,
+    ):
+        self.base_url = base_url
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.tracker = tracker or IngestProgressTracker(base_url)
+
+    def _track(self, job: IngestJob) -> dict | None:
+        path = f"/documents/track_status/{urllib.parse.quote(job.track_id)}"
+        docs = api_json(self.base_url, "GET", path).get("documents") or []
+        name = Path(job.path).name
+        for doc in docs:
+            if Path(str(doc.get("file_path") or "")).name == name:
+                return doc
+        return docs[0] if len(docs) == 1 else None
+
+    def _upload(self, job: IngestJob) -> None:
+        job.attempts += 1
+        job.uploaded_at = time.time()
+        try:
+            resp = upload_file(self.base_url, Path(job.path))
+        except Exception as exc:  # HTTP/network failure counts as a failed attempt
+            self._fail(job, f"upload error: {exc}")
+            return
+        status = str(resp.get("status") or "")
+        if status == "duplicated" and job.attempts == 1:
+            # Already indexed (e.g. a re-run over the same folder): nothing to do.
+            job.state = "skipped"
+            job.finished_at = time.time()
+            job.error = f"upload duplicated: {resp.get('message', '')}"
+            return
+        if status not in ("success", "partial_success") or not resp.get("track_id"):
+            # "duplicated" and similar responses will not change on retry.
+            job.state = "failed"
+            job.finished_at = time.time()
+            job.error = f"upload {status or 'rejected'}: {resp.get('message', '')}"
+            return
+        job.track_id = str(resp["track_id"])
+        job.state = "in_flight"
+
+    def _fail(self, job: IngestJob, error: str) -> None:
+        job.error = error
+        if job.attempts <= self.max_retries:
+            job.state = "retry"
+        else:
+            job.state = "failed"
+            job.finished_at = time.time()
+
+    def _check(self, job: IngestJob) -> None:
+        doc = self._track(job)
+        if job.state == "deleting":
+            # Re-upload only once the failed document is gone, or it is rejected as duplicated.
+            if doc is None:
+                job.state = "retry"
+            return
+        if doc is None:
+            return
+        job.doc_id = str(doc.get("id") or job.doc_id)
+        status = str(doc.get("status") or "").lower()
+        if status == "processed":
+            job.state = "processed"
+            job.finished_at = time.time()
+            job.chunks_count = int(doc.get("chunks_count") or 0)
+            job.error = ""
+        elif status == "failed":
+            self._fail(job, str(doc.get("error_msg") or "processing failed"))
+            if job.state == "retry" and job.doc_id:
+                self._delete(job)
+
+    def _delete(self, job: IngestJob) -> None:
+        resp = api_json(
+            self.base_url,
+            "DELETE",
+            "/documents/delete_document",
+            {"doc_ids": [job.doc_id], "delete_file": False},
+        )
+        # Deletion is refused while the pipeline is busy; try again on the next poll.
+        job.state = "delete_pending" if str(resp.get("status") or "") == "busy" else "deleting"
+
+    def run(self, jobs: list[IngestJob]) -> dict:
+        queue = deque(jobs)
+        in_flight: list[IngestJob] = []
+        started = time.time()
+        while queue or in_flight:
+            stats = self.tracker.poll()
+            if stats["idle_sec"] > self.tracker.stall_timeout:
+                raise PipelineStalledError(
+                    f"No pipeline progress for {stats['idle_sec']:.0f}s. counts={stats['counts']}"
+                )
+            for job in list(in_flight):
+                if job.state == "delete_pending":
+                    self._delete(job)
+                else:
+                    self._check(job)
+                if job.state == "retry":
+                    in_flight.remove(job)
+                    queue.append(job)
+                elif job.state in ("processed", "failed"):
+                    in_flight.remove(job)
+
+            counts = stats["counts"]
+            backlog = counts["pending"] + counts["processing"]
+            if stats["busy"] and backlog == 0:
+                # Busy without document backlog means a non-ingest job (e.g. deletion) holds the pipeline.
+                backlog = self.max_in_flight
+            while queue and len(in_flight) < self.max_in_flight and backlog < self.max_in_flight:
+                job = queue.popleft()
+                self._upload(job)
+                if job.state == "in_flight":
+                    in_flight.append(job)
+                    backlog += 1
+                elif job.state == "retry":
+                    queue.append(job)
+                    break
+            self.tracker.show(stats)
+            if queue or in_flight:
+                time.sleep(self.tracker.interval)
+
+        elapsed = max(1e-6, time.time() - started)
+        processed = [j for j in jobs if j.state == "processed"]
+        chunks = sum(j.chunks_count for j in processed)
+        return {
+            "documents": len(jobs),
+            "processed": len(processed),
+            "failed": sum(1 for j in jobs if j.state == "failed"),
+            "skipped": sum(1 for j in jobs if j.state == "skipped"),
+            "retries": sum(max(0, j.attempts - 1) for j in jobs),
+            "elapsed_sec": round(elapsed, 1),
+            "docs_per_hour": round(len(processed) / elapsed * 3600, 2),
+            "chunks_per_sec": round(chunks / elapsed, 3),
+            "chunks_total": chunks,
+        }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source-dir", default=Path(r"C:\LightRAG\inputs\__enqueued__"), type=Path)
+    parser.add_argument("--base-url", default="http://127.0.0.1:9700")
+    parser.add_argument("--pattern", default="*.pdf", help="Comma-separated glob patterns.")
+    parser.add_argument(
+        "--order",
+        default="chunks-desc",
+        choices=["size-asc", "size-desc", "chunks-asc", "chunks-desc"],
+    )
+    parser.add_argument("--max-in-flight", type=int, default=2, help="Documents pending/processing at once.")
+    parser.add_argument("--max-retries", type=int, default=2)
+    parser.add_argument("--chunk-size", type=int, default=1200, help="Server CHUNK_SIZE, for text files.")
+    parser.add_argument("--tokens-per-page", type=int, default=600, help="PDF chunk estimate: tokens per page.")
+    parser.add_argument(
+        "--bytes-per-chunk",
+        type=int,
+        default=16384,
+        help="Chunk estimate for binary files, and PDFs whose pages cannot be counted.",
+    )
+    parser.add_argument("--timeline-file", default=Path("ingest_timeline.jsonl"), type=Path)
+    parser.add_argument("--stall-timeout", type=float, default=1800)
+    parser.add_argument("--report-file", default=Path("batch_ingest_report.json"), type=Path)
+    args = parser.parse_args()
+
+    if not args.source_dir.exists():
+        raise FileNotFoundError(f"Source dir does not exist: {args.source_dir}")
+    jobs = collect_jobs(
+        args.source_dir,
+        [p.strip() for p in args.pattern.split(",") if p.strip()],
+        args.order,
+        args.chunk_size,
+        args.bytes_per_chunk,
+        args.tokens_per_page,
+    )
+    if not jobs:
+        raise FileNotFoundError(f"No files matching {args.pattern} in {args.source_dir}")
+
+    tracker = IngestProgressTracker(args.base_url, timeline_file=args.timeline_file, stall_timeout=args.stall_timeout)
+    scheduler = BatchIngestScheduler(args.base_url, args.max_in_flight, args.max_retries, tracker)
+    summary = scheduler.run(jobs)
+
+    report = {**summary, "order": args.order, "details": [j.__dict__ for j in jobs]}
+    args.report_file.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Per-project entity dictionary for cross-project contamination checks.
+
+Sources (any combination):
+- LightRAG graphml (graph_chunk_entity_relation.graphml): each node's
+  file_path (<SEP>-joined) maps the entity to projects
+- label snapshots ({project: [labels]}) taken from /graph/label/list while
+  only that project is indexed (run_isolated_project_evaluation writes them,
+  or use --snapshot-project here)
+
+Entities found in exactly one project become that project's dictionary;
+project names are always included. Entities shared across projects stay in
+the automaton as neutral patterns, so a foreign entity that is only part of
+a longer shared label is not reported.
+
+All labels compile into one Aho-Corasick automaton; an answer is scanned in
+a single pass and the leftmost-longest matches naming another project than
+the target are reported as foreign entities.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+from collections import deque
+from pathlib import Path
+
+from ingest_progress import api_json
+from run_strict_project_queries import canonical_project_name, get_projects
+
+DEFAULT_DICTIONARY = Path("entity_dictionary.json")
+GRAPHML_NS = "{http://graphml.graphdrawing.org/xmlns}"
+SEP = "<SEP>"
+MIN_LABEL_LEN = 3
+HAS_LETTER_RE = re.compile(r"[^\W\d_]")
+
+
+def normalize_label(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def usable_label(label: str, min_len: int = MIN_LABEL_LEN) -> bool:
+    # Short and letter-free labels (years, ratios) match too much unrelated text.
+    return len(label) >= min_len and bool(HAS_LETTER_RE.search(label))
+
+
+def load_graphml_entities(path: Path) -> dict[str, set[str]]:
+    """Stream a graphml file and return {entity label: projects of its source files}."""
+    keys: dict[str, str] = {}
+    out: dict[str, set[str]] = {}
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if elem.tag == f"{GRAPHML_NS}key":
+            keys[elem.get("id")] = elem.get("attr.name")
+        elif elem.tag == f"{GRAPHML_NS}node":
+            attrs = {keys.get(d.get("key")): d.text or "" for d in elem.iter(f"{GRAPHML_NS}data")}
+            label = attrs.get("entity_id") or elem.get("id") or ""
+            files = [f for f in attrs.get("file_path", "").split(SEP) if f.strip()]
+            projects = {canonical_project_name(f) for f in files}
+            out.setdefault(label, set()).update(p for p in projects if p)
+            elem.clear()
+        elif elem.tag == f"{GRAPHML_NS}edge":
+            elem.clear()
+    return out
+
+
+def load_label_snapshot(path: Path) -> dict[str, set[str]]:
+    if not path.exists():
+        return {}
+    out: dict[str, set[str]] = {}
+    for project, labels in json.loads(path.read_text(encoding="utf-8")).items():
+        for label in labels:
+            out.setdefault(label, set()).add(project)
+    return out
+
+
+def save_label_snapshot(path: Path, project: str, labels: list[str]) -> None:
+    """Replace one project's labels in a {project: [labels]} snapshot file."""
+    data = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    data[project] = sorted(set(labels))
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def fetch_labels(base_url: str) -> list[str]:
+    labels = api_json(base_url, "GET", "/graph/label/list")
+    return [str(x) for x in labels] if isinstance(labels, list) else []
+
+
+def build_dictionary(entity_projects: list[dict[str, set[str]]], projects: list[str], min_len: int = MIN_LABEL_LEN) -> dict:
+    merged: dict[str, set[str]] = {}
+    for source in entity_projects:
+        for label, owners in source.items():
+            key = normalize_label(label)
+            if usable_label(key, min_len):
+                merged.setdefault(key, set()).update(owners)
+    entities = {label: next(iter(owners)) for label, owners in merged.items() if len(owners) == 1}
+    shared = sorted(label for label, owners in merged.items() if len(owners) > 1)
+    for project in projects:
+        entities[normalize_label(project)] = project
+    return {"entities": dict(sorted(entities.items())), "shared": shared}
+
+
+class AhoCorasick:
+    """Multi-pattern matcher over str; patterns are matched case-sensitively as given."""
+
+    def __init__(self, patterns: list[str]):
+        self.patterns = patterns
+        self.goto: list[dict[str, int]] = [{}]
+        self.out = [-1]
+        for pid, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.out.append(-1)
+                node = nxt
+            self.out[node] = pid
+        self.fail = [0] * len(self.goto)
+        # Nearest proper suffix node that ends a pattern (0: none).
+        self.dict_link = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.dict_link[nxt] = target if self.out[target] >= 0 else self.dict_link[target]
+                queue.append(nxt)
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, pattern id) for every occurrence, overlaps included."""
+        goto, fail, out, dict_link = self.goto, self.fail, self.out, self.dict_link
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if out[node] >= 0 else dict_link[node]
+            while hit:
+                pid = out[hit]
+                yield i + 1 - len(self.patterns[pid]), i + 1, pid
+                hit = dict_link[hit]
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class ContaminationDetector:
+    def __init__(self, entities: dict[str, str], shared: list[str] | None = None):
+        self.labels = list(entities) + [s for s in shared or [] if s not in entities]
+        self.owner = [entities.get(label) for label in self.labels]
+        self.automaton = AhoCorasick(self.labels)
+
+    @classmethod
+    def load(cls, path: Path, projects: list[str]) -> "ContaminationDetector":
+        """Load a dictionary file; without one, fall back to the project names alone."""
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            entities = dict(data["entities"])
+            for project in projects:
+                entities.setdefault(normalize_label(project), project)
+            return cls(entities, data.get("shared"))
+        return cls(build_dictionary([], projects)["entities"])
+
+    def matches(self, text: str) -> list[tuple[str, str | None]]:
+        """Leftmost-longest (label, project) matches; project is None for shared labels."""
+        text = normalize_label(text)
+        found = sorted(self.automaton.iter_matches(text), key=lambda m: (m[0], -m[1]))
+        out = []
+        last_end = 0
+        for start, end, pid in found:
+            if start < last_end:
+                continue
+            label = self.labels[pid]
+            # ASCII labels (member marks, dimensions) must not sit inside a longer token.
+            if _is_word_char(label[0]) and start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if _is_word_char(label[-1]) and end < len(text) and _is_word_char(text[end]):
+                continue
+            out.append((label, self.owner[pid]))
+            last_end = end
+        return out
+
+    def projects_in(self, text: str) -> set[str]:
+        return {project for _, project in self.matches(text) if project}
+
+    def foreign_entities(self, text: str, targets: set[str]) -> list[tuple[str, str]]:
+        """Distinct (label, project) hits of projects outside `targets`, in order of appearance."""
+        seen = []
+        for label, project in self.matches(text):
+            if project and project not in targets and (label, project) not in seen:
+                seen.append((label, project))
+        return seen
+
+
+def format_hits(hits: list[tuple[str, str]]) -> str:
+    return ", ".join(label if label == normalize_label(project) else f"{label}({project})" for label, project in hits)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--graphml", type=Path, action="append", default=[], help="LightRAG graphml file (repeatable).")
+    parser.add_argument("--snapshot-file", type=Path, default=Path("entity_labels.json"))
+    parser.add_argument("--base-url", default="http://127.0.0.1:9700")
+    parser.add_argument(
+        "--snapshot-project",
+        help="Save /graph/label/list of the running index as this project's labels, then build.",
+    )
+    parser.add_argument("--projects", default="", help="Comma-separated project names (default: processed documents).")
+    parser.add_argument("--min-len", type=int, default=MIN_LABEL_LEN)
+    parser.add_argument("--output", type=Path, default=DEFAULT_DICTIONARY)
+    args = parser.parse_args()
+
+    if args.snapshot_project:
+        save_label_snapshot(args.snapshot_file, args.snapshot_project, fetch_labels(args.base_url))
+
+    sources = [load_graphml_entities(p) for p in args.graphml]
+    sources.append(load_label_snapshot(args.snapshot_file))
+    projects = [p.strip() for p in args.projects.split(",") if p.strip()]
+    if not projects:
+        projects = get_projects(args.base_url)
+    dictionary = build_dictionary(sources, projects, args.min_len)
+    args.output.write_text(json.dumps(dictionary, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    per_project: dict[str, int] = {}
+    for project in dictionary["entities"].values():
+        per_project[project] = per_project.get(project, 0) + 1
+    print(
+        json.dumps(
+            {
+                "unique_entities": len(dictionary["entities"]),
+                "shared_entities": len(dictionary["shared"]),
+                "per_project": per_project,
+                "output": str(args.output),
+            },
+            ensure_ascii=False,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
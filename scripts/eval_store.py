@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+SQLite store for evaluation runs, with trend and regression queries.
+
+Every evaluation script appends one run (script, timestamp, mode, preset,
+index fingerprint, parameters, summary) and its per-row results here; the
+markdown reports are rendered from the stored rows.
+
+Commands:
+- runs         list recent runs
+- trend        pass rate and latency per run of one script
+- regressions  rows that passed in --base and fail in --head (and fixes)
+- slowest      questions with the highest mean latency
+- flaky        questions whose pass/fail flips across recent runs
+- render       re-render a stored run's markdown report
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import importlib
+import json
+import sqlite3
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_DB = Path("eval_results.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    script TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    mode TEXT,
+    preset TEXT,
+    index_fingerprint TEXT,
+    params TEXT NOT NULL DEFAULT '{}',
+    summary TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    row_no INTEGER NOT NULL,
+    question_no INTEGER NOT NULL,
+    project TEXT NOT NULL DEFAULT '',
+    question TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    score REAL,
+    latency_sec REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (run_id, row_no)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_script ON runs(script, started_at);
+CREATE INDEX IF NOT EXISTS idx_results_project ON results(project, run_id);
+CREATE INDEX IF NOT EXISTS idx_results_question ON results(question_no, project, run_id);
+"""
+
+
+def connect(path: Path = DEFAULT_DB) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def index_fingerprint(base_url: str) -> str:
+    """Short hash of processed document ids and chunk counts; empty when unreachable."""
+    try:
+        url = f"{base_url.rstrip('/')}/documents"
+        data = json.loads(urllib.request.urlopen(url, timeout=30).read().decode("utf-8"))
+    except Exception:  # the store must not fail a finished evaluation run
+        return ""
+    processed = (data.get("statuses") or {}).get("processed") or []
+    keys = sorted(f"{d.get('id')}:{d.get('chunks_count')}" for d in processed)
+    return hashlib.sha1("\n".join(keys).encode("utf-8")).hexdigest()[:12]
+
+
+def record_run(
+    conn: sqlite3.Connection,
+    script: str,
+    rows: list[dict],
+    mode: str | None = None,
+    preset: str | None = None,
+    fingerprint: str | None = None,
+    params: dict | None = None,
+    summary: dict | None = None,
+) -> int:
+    """Store one run. Rows need no/question/passed; project, score, latency_sec are optional."""
+    with conn:
+        cur = conn.execute(
+            "INSERT INTO runs (script, started_at, mode, preset, index_fingerprint, params, summary) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                script,
+                datetime.now().isoformat(timespec="seconds"),
+                mode,
+                preset,
+                fingerprint,
+                json.dumps(params or {}, ensure_ascii=False),
+                json.dumps(summary or {}, ensure_ascii=False),
+            ),
+        )
+        run_id = int(cur.lastrowid)
+        conn.executemany(
+            "INSERT INTO results (run_id, row_no, question_no, project, question, passed, score, latency_sec, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    run_id,
+                    i,
+                    int(r["no"]),
+                    str(r.get("project") or ""),
+                    str(r["question"]),
+                    1 if r["passed"] else 0,
+                    r.get("score"),
+                    r.get("latency_sec"),
+                    json.dumps(r, ensure_ascii=False),
+                )
+                for i, r in enumerate(rows)
+            ],
+        )
+    return run_id
+
+
+def load_run(conn: sqlite3.Connection, run_id: int) -> dict:
+    row = conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    if row is None:
+        raise KeyError(f"No run {run_id}")
+    run = dict(row)
+    run["params"] = json.loads(run["params"])
+    run["summary"] = json.loads(run["summary"])
+    return run
+
+
+def load_rows(conn: sqlite3.Connection, run_id: int) -> list[dict]:
+    cur = conn.execute("SELECT data FROM results WHERE run_id = ? ORDER BY row_no", (run_id,))
+    return [json.loads(r["data"]) for r in cur]
+
+
+def print_table(headers: list[str], rows: list[tuple]) -> None:
+    print("| " + " | ".join(headers) + " |")
+    print("|" + "---|" * len(headers))
+    for r in rows:
+        print("| " + " | ".join("" if v is None else (f"{v:.3f}" if isinstance(v, float) else str(v)) for v in r) + " |")
+
+
+def cmd_runs(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    cur = conn.execute(
+        "SELECT r.run_id, r.script, r.started_at, r.mode, r.preset, r.index_fingerprint, "
+        "COUNT(x.row_no), AVG(x.passed) FROM runs r LEFT JOIN results x ON x.run_id = r.run_id "
+        "WHERE (? IS NULL OR r.script = ?) GROUP BY r.run_id ORDER BY r.run_id DESC LIMIT ?",
+        (args.script, args.script, args.limit),
+    )
+    print_table(["run", "script", "started", "mode", "preset", "index", "rows", "pass_rate"], [tuple(r) for r in cur])
+
+
+def cmd_trend(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    cur = conn.execute(
+        "SELECT r.run_id, r.started_at, r.mode, r.preset, r.index_fingerprint, COUNT(*), AVG(x.passed), "
+        "AVG(x.latency_sec), MAX(x.latency_sec) FROM runs r JOIN results x ON x.run_id = r.run_id "
+        "WHERE r.script = ? AND (? IS NULL OR x.project = ?) GROUP BY r.run_id ORDER BY r.run_id DESC LIMIT ?",
+        (args.script, args.project, args.project, args.limit),
+    )
+    rows = [tuple(r) for r in cur][::-1]
+    print_table(["run", "started", "mode", "preset", "index", "rows", "pass_rate", "mean_latency", "max_latency"], rows)
+
+
+def cmd_regressions(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    cur = conn.execute(
+        "SELECT b.question_no, b.project, b.question, b.passed, h.passed, b.latency_sec, h.latency_sec "
+        "FROM results b JOIN results h ON h.question_no = b.question_no AND h.project = b.project "
+        "WHERE b.run_id = ? AND h.run_id = ? AND (b.passed != h.passed "
+        "OR (? > 0 AND h.latency_sec > b.latency_sec * (1 + ?))) "
+        "ORDER BY h.passed, b.question_no, b.project",
+        (args.base, args.head, args.latency_ratio, args.latency_ratio),
+    )
+    rows = []
+    for r in cur:
+        change = "regressed" if r[3] and not r[4] else ("fixed" if r[4] and not r[3] else "slower")
+        rows.append((change, r[0], r[1], r[2], r[5], r[6]))
+    print_table(["change", "no", "project", "question", "base_latency", "head_latency"], rows)
+
+
+def cmd_slowest(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    cur = conn.execute(
+        "SELECT x.question_no, x.project, x.question, COUNT(*), AVG(x.latency_sec), MAX(x.latency_sec) "
+        "FROM results x JOIN runs r ON r.run_id = x.run_id "
+        "WHERE x.latency_sec IS NOT NULL AND (? IS NULL OR r.script = ?) "
+        "GROUP BY x.question_no, x.project ORDER BY AVG(x.latency_sec) DESC LIMIT ?",
+        (args.script, args.script, args.limit),
+    )
+    print_table(["no", "project", "question", "runs", "mean_latency", "max_latency"], [tuple(r) for r in cur])
+
+
+def cmd_flaky(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    cur = conn.execute(
+        "SELECT x.question_no, x.project, x.question, COUNT(*), SUM(x.passed) FROM results x "
+        "WHERE x.run_id IN (SELECT run_id FROM runs WHERE script = ? ORDER BY run_id DESC LIMIT ?) "
+        "GROUP BY x.question_no, x.project HAVING SUM(x.passed) > 0 AND SUM(x.passed) < COUNT(*) "
+        "ORDER BY MIN(SUM(x.passed), COUNT(*) - SUM(x.passed)) DESC, x.question_no",
+        (args.script, args.last),
+    )
+    print_table(["no", "project", "question", "runs", "passes"], [tuple(r) for r in cur])
+
+
+def cmd_render(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    run = load_run(conn, args.run_id)
+    module = importlib.import_module(run["script"])
+    if not hasattr(module, "render_report"):
+        raise RuntimeError(f"{run['script']} has no per-run markdown report.")
+    text = module.render_report(run, load_rows(conn, args.run_id))
+    args.output_md.write_text(text, encoding="utf-8", newline="\n")
+    print(json.dumps({"run_id": args.run_id, "output": str(args.output_md)}, ensure_ascii=False))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("runs")
+    p.add_argument("--script")
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(func=cmd_runs)
+
+    p = sub.add_parser("trend")
+    p.add_argument("--script", required=True)
+    p.add_argument("--project")
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(func=cmd_trend)
+
+    p = sub.add_parser("regressions")
+    p.add_argument("--base", type=int, required=True)
+    p.add_argument("--head", type=int, required=True)
+    p.add_argument("--latency-ratio", type=float, default=0.0, help="Also list rows slower by more than this ratio.")
+    p.set_defaults(func=cmd_regressions)
+
+    p = sub.add_parser("slowest")
+    p.add_argument("--script")
+    p.add_argument("--limit", type=int, default=10)
+    p.set_defaults(func=cmd_slowest)
+
+    p = sub.add_parser("flaky")
+    p.add_argument("--script", required=True)
+    p.add_argument("--last", type=int, default=10, help="Number of recent runs to consider.")
+    p.set_defaults(func=cmd_flaky)
+
+    p = sub.add_parser("render")
+    p.add_argument("--run-id", type=int, required=True)
+    p.add_argument("--output-md", type=Path, required=True)
+    p.set_defaults(func=cmd_render)
+
+    args = parser.parse_args()
+    if not args.db.exists():
+        raise FileNotFoundError(f"Results database does not exist: {args.db}")
+    conn = connect(args.db)
+    args.func(conn, args)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Pre-extract PDF text locally, in parallel, before LightRAG upload.
+
+What it does:
+- splits every PDF into page ranges and extracts them across a process pool
+- keeps page numbers as [[PAGE n]] marker lines
+- runs the result through normalize_corpus.normalize_text (mojibake repair,
+  NFKC, zero-width removal, PUA replacement) in the same pool, per PDF
+- checks it with validate_corpus.count_issues (U+FFFD / PUA)
+- writes one UTF-8 .txt per PDF, mirroring its path under --input-dir (so
+  same-named PDFs in different folders do not overwrite each other), and a
+  JSON report
+- a PDF that fails to open or extract is listed under "errors" in the
+  report; the rest of the batch still runs
+
+Requires PyMuPDF (`pip install pymupdf`) or pypdf (`pip install pypdf`).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from normalize_corpus import PUA_RE, load_map, maybe_repair_mojibake, normalize_text
+from validate_corpus import count_issues
+
+PAGE_MARKER = "[[PAGE {}]]"
+PAGE_MARKER_RE = re.compile(r"^\[\[PAGE (\d+)\]\]$", re.M)
+
+
+@dataclass
+class ExtractStats:
+    path: str
+    output: str
+    pages: int
+    chars: int
+    repaired_mojibake: bool
+    pua_before: int
+    pua_after: int
+    replacement_char_count: int
+    seconds: float
+
+
+def _open_pdf(path: str):
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        pass
+    else:
+        return "fitz", fitz.open(path)
+    try:
+        from pypdf import PdfReader
+    except ImportError as exc:
+        raise RuntimeError("PDF extraction needs PyMuPDF (pip install pymupdf) or pypdf (pip install pypdf).") from exc
+    return "pypdf", PdfReader(path)
+
+
+def page_count(path: str) -> int:
+    backend, doc = _open_pdf(path)
+    if backend == "fitz":
+        with doc:
+            return doc.page_count
+    return len(doc.pages)
+
+
+def extract_pages(path: str, start: int, end: int) -> list[tuple[int, str]]:
+    """Extract pages [start, end) from one PDF; runs inside a worker process."""
+    backend, doc = _open_pdf(path)
+    out: list[tuple[int, str]] = []
+    if backend == "fitz":
+        with doc:
+            for i in range(start, end):
+                out.append((i + 1, doc.load_page(i).get_text("text")))
+    else:
+        for i in range(start, end):
+            out.append((i + 1, doc.pages[i].extract_text() or ""))
+    return out
+
+
+def assemble_pages(pages: list[tuple[int, str]]) -> str:
+    parts = []
+    for no, text in sorted(pages):
+        parts.append(PAGE_MARKER.format(no))
+        parts.append(text.strip())
+    return "\n\n".join(parts) + "\n"
+
+
+def finish_pdf(path: str, out: str, pages: int, extracted: list[tuple[int, str]], replacements: dict[str, str]) -> ExtractStats:
+    """Repair, normalize, validate and write one PDF's text; runs inside a worker process."""
+    t0 = time.time()
+    repaired, repaired_flag = maybe_repair_mojibake(assemble_pages(extracted))
+    pua_before = len(PUA_RE.findall(repaired))
+    normalized = normalize_text(repaired, replacements)
+    issues = count_issues(normalized)
+    Path(out).parent.mkdir(parents=True, exist_ok=True)
+    Path(out).write_text(normalized, encoding="utf-8", newline="\n")
+    return ExtractStats(
+        path=path,
+        output=out,
+        pages=pages,
+        chars=len(normalized),
+        repaired_mojibake=repaired_flag,
+        pua_before=pua_before,
+        pua_after=issues["pua_count"],
+        replacement_char_count=issues["replacement_char_count"],
+        seconds=round(time.time() - t0, 2),
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input-dir", required=True, type=Path)
+    parser.add_argument("--output-dir", required=True, type=Path)
+    parser.add_argument(
+        "--map-file",
+        type=Path,
+        default=Path("config/pua_replacements.json"),
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pages-per-task", type=int, default=8)
+    parser.add_argument("--force", action="store_true", help="Re-extract even when the .txt is newer than the PDF.")
+    parser.add_argument(
+        "--report-file",
+        type=Path,
+        default=Path("extraction_report.json"),
+    )
+    args = parser.parse_args()
+
+    if not args.input_dir.exists():
+        raise FileNotFoundError(f"Input dir does not exist: {args.input_dir}")
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    replacements = load_map(args.map_file)
+
+    pdfs = []
+    skipped = 0
+    for pdf in sorted(args.input_dir.rglob("*.pdf")):
+        out = args.output_dir / pdf.relative_to(args.input_dir).with_suffix(".txt")
+        if not args.force and out.exists() and out.stat().st_mtime >= pdf.stat().st_mtime:
+            skipped += 1
+            continue
+        pdfs.append((pdf, out))
+
+    stats: list[ExtractStats] = []
+    errors: list[dict] = []
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        count_futures = [pool.submit(page_count, str(pdf)) for pdf, _ in pdfs]
+        futures = {}
+        for (pdf, out), count_fut in zip(pdfs, count_futures):
+            try:
+                pages = count_fut.result()
+            except Exception as exc:  # corrupt or encrypted PDF: report it, extract the rest
+                errors.append({"path": str(pdf), "error": f"{type(exc).__name__}: {exc}"})
+                continue
+            futures[pdf] = (out, pages, [
+                pool.submit(extract_pages, str(pdf), start, min(start + args.pages_per_task, pages))
+                for start in range(0, pages, args.pages_per_task)
+            ])
+        # Normalize/validate in workers too, each PDF as soon as its pages are in.
+        finishing = {}
+        for pdf, (out, pages, page_futs) in futures.items():
+            try:
+                extracted = [page for fut in page_futs for page in fut.result()]
+            except Exception as exc:
+                errors.append({"path": str(pdf), "error": f"{type(exc).__name__}: {exc}"})
+                continue
+            finishing[pdf] = pool.submit(finish_pdf, str(pdf), str(out), pages, extracted, replacements)
+        for pdf, fut in finishing.items():
+            try:
+                stats.append(fut.result())
+            except Exception as exc:
+                errors.append({"path": str(pdf), "error": f"{type(exc).__name__}: {exc}"})
+                continue
+            print(f"[extract] {pdf.name}: {stats[-1].pages} pages", flush=True)
+    for e in errors:
+        print(f"[extract] FAILED {e['path']}: {e['error']}", flush=True)
+
+    invalid = [s for s in stats if s.pua_after or s.replacement_char_count]
+    report = {
+        "input_dir": str(args.input_dir),
+        "output_dir": str(args.output_dir),
+        "files_extracted": len(stats),
+        "files_failed": len(errors),
+        "files_skipped_up_to_date": skipped,
+        "pages_extracted": sum(s.pages for s in stats),
+        "elapsed_sec": round(time.time() - started, 1),
+        "mojibake_repaired_files": sum(1 for s in stats if s.repaired_mojibake),
+        "files_with_replacement_char": sum(1 for s in stats if s.replacement_char_count > 0),
+        "files_with_pua_after": sum(1 for s in stats if s.pua_after > 0),
+        "details": [s.__dict__ for s in stats],
+        "errors": errors,
+    }
+    args.report_file.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(json.dumps({k: report[k] for k in report if k not in ("details", "errors")}, ensure_ascii=False, indent=2))
+    return 1 if invalid or errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
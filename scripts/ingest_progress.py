@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Track LightRAG ingestion progress with per-document timings and ETA.
+
+- polls /documents/pipeline_status and /documents/status_counts on an adaptive
+  schedule (fast while things change, backing off while the pipeline is quiet)
+- fetches /documents only when counts change, to record per-document state
+  transitions and their durations
+- appends transitions and pipeline progress messages to a JSONL timeline
+- reports chunks/sec, documents/hour and a live ETA
+- raises PipelineStalledError when nothing progresses for --stall-timeout
+  seconds, instead of relying on a fixed wall-clock timeout
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+STATES = ("pending", "processing", "processed", "failed")
+
+
+class PipelineStalledError(TimeoutError):
+    """Raised when the pipeline shows no progress for the stall window."""
+
+
+def api_json(base_url: str, method: str, path: str, payload: dict | None = None) -> dict:
+    body = None if payload is None else json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(
+        f"{base_url.rstrip('/')}{path}",
+        data=body,
+        headers={"Content-Type": "application/json; charset=utf-8"},
+        method=method,
+    )
+    with urllib.request.urlopen(req, timeout=300) as resp:
+        raw = resp.read().decode("utf-8")
+    if not raw.strip():
+        return {}
+    return json.loads(raw)
+
+
+def normalize_counts(counts: dict) -> dict[str, int]:
+    lowered = {str(k).lower(): int(v) for k, v in (counts or {}).items()}
+    return {state: lowered.get(state, 0) for state in STATES}
+
+
+class IngestProgressTracker:
+    def __init__(
+        self,
+        base_url: str,
+        timeline_file: Path | None = None,
+        min_interval: float = 1.0,
+        max_interval: float = 15.0,
+        stall_timeout: float = 1800.0,
+        live: bool = True,
+    ):
+        self.base_url = base_url
+        self.timeline_file = timeline_file
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stall_timeout = stall_timeout
+        self.live = live
+        self.started = time.time()
+        self.interval = min_interval
+        self.counts: dict[str, int] = {}
+        self.docs: dict[str, dict] = {}
+        self.completed: list[dict] = []
+        self.pipeline: dict = {}
+        self._signature: tuple | None = None
+        self._last_progress = time.time()
+        self._history_len = 0
+
+    def _record(self, event: dict) -> None:
+        if self.timeline_file is None:
+            return
+        event = {"ts": round(time.time(), 3), **event}
+        with self.timeline_file.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def _record_messages(self, pipeline: dict) -> None:
+        history = pipeline.get("history_messages") or []
+        if len(history) < self._history_len:
+            # History is reset when a new pipeline job starts.
+            self._history_len = 0
+        for message in history[self._history_len :]:
+            self._record({"event": "message", "message": str(message)})
+        self._history_len = len(history)
+
+    def _refresh_documents(self) -> None:
+        statuses = api_json(self.base_url, "GET", "/documents").get("statuses") or {}
+        now = time.time()
+        for state, items in statuses.items():
+            state = str(state).lower()
+            for item in items or []:
+                doc_id = str(item.get("id") or item.get("file_path") or "")
+                if not doc_id:
+                    continue
+                prev = self.docs.get(doc_id)
+                if prev is not None and prev["state"] == state:
+                    prev["chunks_count"] = item.get("chunks_count") or prev["chunks_count"]
+                    continue
+                doc = {
+                    "id": doc_id,
+                    "file_path": str(item.get("file_path") or ""),
+                    "state": state,
+                    "since": now,
+                    "first_seen": prev["first_seen"] if prev else now,
+                    "chunks_count": int(item.get("chunks_count") or 0),
+                }
+                self.docs[doc_id] = doc
+                if prev is None:
+                    continue
+                event = {
+                    "event": "doc_state",
+                    "doc_id": doc_id,
+                    "file_path": doc["file_path"],
+                    "from": prev["state"],
+                    "to": state,
+                    "state_sec": round(now - prev["since"], 1),
+                    "chunks_count": doc["chunks_count"],
+                }
+                if state in ("processed", "failed"):
+                    event["total_sec"] = round(now - doc["first_seen"], 1)
+                    if item.get("error_msg") or item.get("error"):
+                        event["error"] = str(item.get("error_msg") or item.get("error"))
+                    if state == "processed":
+                        self.completed.append(doc)
+                self._record(event)
+
+    def poll(self) -> dict:
+        pipeline = api_json(self.base_url, "GET", "/documents/pipeline_status")
+        counts = normalize_counts(api_json(self.base_url, "GET", "/documents/status_counts").get("status_counts", {}))
+        if counts != self.counts:
+            self._refresh_documents()
+        self.counts = counts
+        self.pipeline = pipeline
+        self._record_messages(pipeline)
+
+        signature = (
+            tuple(counts.values()),
+            pipeline.get("latest_message"),
+            pipeline.get("cur_batch"),
+            self._history_len,
+        )
+        if signature != self._signature:
+            self._signature = signature
+            self._last_progress = time.time()
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * 2)
+        return self.stats()
+
+    def stats(self) -> dict:
+        elapsed = max(1e-6, time.time() - self.started)
+        chunks = sum(d["chunks_count"] for d in self.completed)
+        remaining = self.counts.get("pending", 0) + self.counts.get("processing", 0)
+        docs_per_sec = len(self.completed) / elapsed
+        eta = None
+        if remaining and docs_per_sec > 0:
+            eta = remaining / docs_per_sec
+        elif remaining and self.pipeline.get("cur_batch") and self.pipeline.get("batchs"):
+            cur = int(self.pipeline["cur_batch"])
+            batches = int(self.pipeline["batchs"])
+            if 0 < cur <= batches:
+                eta = elapsed * (batches - cur) / cur
+        return {
+            "elapsed_sec": round(elapsed, 1),
+            "counts": dict(self.counts),
+            "busy": bool(self.pipeline.get("busy", False)),
+            "docs_completed": len(self.completed),
+            "chunks_completed": chunks,
+            "chunks_per_sec": round(chunks / elapsed, 3),
+            "docs_per_hour": round(docs_per_sec * 3600, 2),
+            "eta_sec": None if eta is None else round(eta, 0),
+            "idle_sec": round(time.time() - self._last_progress, 1),
+        }
+
+    def show(self, stats: dict) -> None:
+        if not self.live:
+            return
+        eta = "-" if stats["eta_sec"] is None else f"{stats['eta_sec'] / 60:.1f}m"
+        c = stats["counts"]
+        sys.stderr.write(
+            f"\r[ingest] processed={c.get('processed', 0)} processing={c.get('processing', 0)} "
+            f"pending={c.get('pending', 0)} failed={c.get('failed', 0)} "
+            f"{stats['chunks_per_sec']:.2f} chunks/s {stats['docs_per_hour']:.1f} docs/h ETA {eta}   "
+        )
+        sys.stderr.flush()
+
+    def wait_until(self, done, timeout_sec: float | None = None) -> dict:
+        """Poll until done(stats) is true; raise PipelineStalledError on no progress."""
+        start = time.time()
+        while True:
+            stats = self.poll()
+            self.show(stats)
+            if done(stats):
+                if self.live:
+                    sys.stderr.write("\n")
+                self._record({"event": "done", **stats})
+                return stats
+            if stats["idle_sec"] > self.stall_timeout:
+                self._record({"event": "stalled", **stats})
+                raise PipelineStalledError(
+                    f"No pipeline progress for {stats['idle_sec']:.0f}s. counts={stats['counts']}"
+                )
+            if timeout_sec is not None and time.time() - start > timeout_sec:
+                raise TimeoutError(f"Ingestion did not finish in {timeout_sec}s. counts={stats['counts']}")
+            time.sleep(self.interval)
+
+    def wait_idle(self) -> dict:
+        return self.wait_until(lambda s: not s["busy"])
+
+    def wait_processed(self, expected_processed: int) -> dict:
+        def done(stats: dict) -> bool:
+            c = stats["counts"]
+            if c["processing"] or c["pending"]:
+                return False
+            if c["failed"]:
+                raise RuntimeError(f"Document processing failed. counts={c}")
+            return c["processed"] >= expected_processed
+
+        return self.wait_until(done)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:9700")
+    parser.add_argument("--timeline-file", type=Path, default=Path("ingest_timeline.jsonl"))
+    parser.add_argument("--expected-processed", type=int, default=0, help="Wait for this many processed documents.")
+    parser.add_argument("--min-interval", type=float, default=1.0)
+    parser.add_argument("--max-interval", type=float, default=15.0)
+    parser.add_argument("--stall-timeout", type=float, default=1800.0, help="Seconds without progress before failing.")
+    args = parser.parse_args()
+
+    tracker = IngestProgressTracker(
+        args.base_url,
+        timeline_file=args.timeline_file,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        stall_timeout=args.stall_timeout,
+    )
+    if args.expected_processed:
+        stats = tracker.wait_processed(args.expected_processed)
+    else:
+        stats = tracker.wait_until(
+            lambda s: not s["busy"] and not s["counts"]["pending"] and not s["counts"]["processing"]
+        )
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Watch an inputs directory and ingest new or changed reports continuously.
+
+Loop:
+- poll the directory tree with os.scandir (size + mtime per file, no content
+  reads) and debounce files until they stop changing
+- on a process pool: extract PDFs (extract_pdf_text), repair mojibake,
+  normalize_text, and check U+FFFD/PUA with validate_corpus.count_issues
+- upload only files that pass through /documents/upload as UTF-8 .txt,
+  named after their path under --input-dir ("sub__report.txt"), so
+  same-named files in different folders stay separate documents;
+  a changed file first has its previous document deleted (re-issued while
+  the server answers busy) and is uploaded once that document is gone
+- write queue depth, processing latency and counters to --status-file
+
+State (size/mtime of ingested files) is kept in --state-file, so a restart
+does not re-scan or re-upload the corpus.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+from batch_ingest import upload_file
+from extract_pdf_text import assemble_pages, extract_pages, page_count
+from ingest_progress import api_json
+from normalize_corpus import TARGET_EXTENSIONS, load_map, maybe_repair_mojibake, normalize_text, read_text_best_effort
+from query_client import percentile
+from validate_corpus import count_issues
+
+WATCH_EXTENSIONS = TARGET_EXTENSIONS | {".pdf"}
+
+
+def scan_tree(root: Path) -> dict[str, tuple[int, float]]:
+    """Return {path: (size, mtime)}; skips LightRAG's __enqueued__-style folders."""
+    out: dict[str, tuple[int, float]] = {}
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith("_"):
+                        stack.append(entry.path)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in WATCH_EXTENSIONS:
+                    st = entry.stat()
+                    out[entry.path] = (st.st_size, st.st_mtime)
+    return out
+
+
+def upload_name(path: Path, root: Path) -> str:
+    """Document name: the path under the watch root joined with "__"; PDFs upload as .txt."""
+    rel = path.relative_to(root)
+    if rel.suffix.lower() == ".pdf":
+        rel = rel.with_suffix(".txt")
+    return "__".join(rel.parts)
+
+
+def prepare_file(path: str, root: str, map_file: str) -> dict:
+    """Extract/normalize/validate one file; runs inside a worker process."""
+    p = Path(path)
+    if p.suffix.lower() == ".pdf":
+        raw = assemble_pages(extract_pages(path, 0, page_count(path)))
+    else:
+        raw = read_text_best_effort(p)
+    name = upload_name(p, Path(root))
+    repaired, repaired_flag = maybe_repair_mojibake(raw)
+    text = normalize_text(repaired, load_map(Path(map_file)))
+    issues = count_issues(text)
+    return {
+        "path": path,
+        "name": name,
+        "text": text,
+        "repaired_mojibake": repaired_flag,
+        "ok": not (issues["replacement_char_count"] or issues["pua_count"]),
+        **issues,
+    }
+
+
+def doc_ids_for(base_url: str, name: str) -> list[str]:
+    statuses = api_json(base_url, "GET", "/documents").get("statuses") or {}
+    return [
+        str(item.get("id"))
+        for items in statuses.values()
+        for item in items or []
+        if Path(str(item.get("file_path") or "")).name == name and item.get("id")
+    ]
+
+
+def delete_docs(base_url: str, doc_ids: list[str]) -> str:
+    resp = api_json(base_url, "DELETE", "/documents/delete_document", {"doc_ids": doc_ids, "delete_file": False})
+    return str(resp.get("status") or "")
+
+
+class IngestWatcher:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.state: dict[str, list] = {}
+        if args.state_file.exists():
+            self.state = json.loads(args.state_file.read_text(encoding="utf-8"))
+        self.debouncing: dict[str, tuple[tuple[int, float], float, float]] = {}
+        self.preparing: dict[str, tuple[Future, float, tuple[int, float]]] = {}
+        # One entry per path; state is delete_pending -> deleting -> upload.
+        self.uploads: dict[str, dict] = {}
+        self.latencies: list[float] = []
+        self.counters = {"uploaded": 0, "rejected": 0, "failed": 0}
+        self.events: list[dict] = []
+
+    def _event(self, event: dict) -> None:
+        event = {"ts": round(time.time(), 3), **event}
+        self.events = (self.events + [event])[-50:]
+        print(json.dumps(event, ensure_ascii=False), flush=True)
+
+    def baseline(self) -> None:
+        for path, sig in scan_tree(self.args.input_dir).items():
+            self.state.setdefault(path, list(sig))
+        self._save_state()
+
+    def _save_state(self) -> None:
+        self.args.state_file.write_text(json.dumps(self.state, ensure_ascii=False), encoding="utf-8")
+
+    def detect(self) -> None:
+        now = time.time()
+        for path, sig in scan_tree(self.args.input_dir).items():
+            if self.state.get(path) == list(sig) or path in self.preparing:
+                continue
+            if path in self.uploads and self.uploads[path]["sig"] == sig:
+                continue  # already prepared, waiting for its upload
+            prev = self.debouncing.get(path)
+            if prev is None or prev[0] != sig:
+                arrived = prev[2] if prev else now
+                self.debouncing[path] = (sig, now, arrived)
+
+    def dispatch(self, pool: ProcessPoolExecutor) -> None:
+        now = time.time()
+        for path, (sig, changed_at, arrived) in list(self.debouncing.items()):
+            if now - changed_at >= self.args.debounce:
+                del self.debouncing[path]
+                fut = pool.submit(prepare_file, path, str(self.args.input_dir), str(self.args.map_file))
+                self.preparing[path] = (fut, arrived, sig)
+
+    def collect(self) -> None:
+        for path, (fut, arrived, sig) in list(self.preparing.items()):
+            if not fut.done():
+                continue
+            del self.preparing[path]
+            try:
+                result = fut.result()
+            except Exception as exc:  # extraction errors are reported, not fatal
+                self.counters["failed"] += 1
+                self._event({"event": "failed", "path": path, "error": str(exc)})
+                self.state[path] = list(sig)
+                continue
+            if not result["ok"]:
+                self.counters["rejected"] += 1
+                self._event(
+                    {
+                        "event": "rejected",
+                        "path": path,
+                        "replacement_char_count": result["replacement_char_count"],
+                        "pua_count": result["pua_count"],
+                    }
+                )
+                self.state[path] = list(sig)
+                continue
+            prev = self.uploads.get(path)
+            if prev is not None:
+                # A newer version of a file still waiting: keep its deletion progress.
+                arrived = prev["arrived"]
+                upload_state, doc_ids = prev["upload_state"], prev["doc_ids"]
+            else:
+                upload_state, doc_ids = ("delete_pending", []) if path in self.state else ("upload", [])
+            self.uploads[path] = {
+                **result,
+                "arrived": arrived,
+                "sig": sig,
+                "attempts": 0,
+                "upload_state": upload_state,
+                "doc_ids": doc_ids,
+            }
+
+    def _delete(self, item: dict) -> None:
+        if not item["doc_ids"]:
+            item["doc_ids"] = doc_ids_for(self.args.base_url, item["name"])
+        if not item["doc_ids"]:
+            item["upload_state"] = "upload"
+            return
+        # Deletion is refused while the pipeline is busy; try again on the next loop.
+        busy = delete_docs(self.args.base_url, item["doc_ids"]) == "busy"
+        item["upload_state"] = "delete_pending" if busy else "deleting"
+
+    def _upload(self, item: dict) -> bool:
+        """Upload one prepared file; True when the entry is finished."""
+        try:
+            resp = upload_file(
+                self.args.base_url,
+                Path(item["name"]),
+                data=item["text"].encode("utf-8"),
+                filename=item["name"],
+            )
+        except Exception:  # server unavailable: retry on the next loop, not counted as an attempt
+            return False
+        status = str(resp.get("status") or "")
+        item["attempts"] += 1
+        if status in ("success", "partial_success"):
+            latency = time.time() - item["arrived"]
+            self.latencies = (self.latencies + [latency])[-500:]
+            self.counters["uploaded"] += 1
+            self.state[item["path"]] = list(item["sig"])
+            self._event({"event": "uploaded", "path": item["path"], "latency_sec": round(latency, 1)})
+            return True
+        if status == "duplicated":
+            # A document with this name is still indexed: replace it, never give up on the new version.
+            doc_ids = doc_ids_for(self.args.base_url, item["name"])
+            if doc_ids:
+                item["upload_state"], item["doc_ids"], item["attempts"] = "delete_pending", doc_ids, 0
+                return False
+            # Same content already indexed under another name.
+            self.state[item["path"]] = list(item["sig"])
+            self._event({"event": "duplicate_content", "path": item["path"]})
+            return True
+        if item["attempts"] <= self.args.max_retries:
+            return False
+        self.counters["failed"] += 1
+        self.state[item["path"]] = list(item["sig"])
+        self._event({"event": "upload_failed", "path": item["path"], "status": status})
+        return True
+
+    def upload(self) -> None:
+        for path, item in list(self.uploads.items()):
+            try:
+                if item["upload_state"] == "delete_pending":
+                    self._delete(item)
+                elif item["upload_state"] == "deleting":
+                    remaining = set(item["doc_ids"]) & set(doc_ids_for(self.args.base_url, item["name"]))
+                    if not remaining:
+                        item["upload_state"], item["doc_ids"] = "upload", []
+            except Exception:  # server unavailable: retry on the next loop
+                continue
+            if item["upload_state"] == "upload" and self._upload(item):
+                del self.uploads[path]
+        self._save_state()
+
+    def status(self) -> dict:
+        return {
+            "ts": round(time.time(), 3),
+            "queue_depth": len(self.debouncing) + len(self.preparing) + len(self.uploads),
+            "debouncing": len(self.debouncing),
+            "preparing": len(self.preparing),
+            "awaiting_upload": len(self.uploads),
+            **self.counters,
+            "latency_p50_sec": round(percentile(self.latencies, 50), 1),
+            "latency_p95_sec": round(percentile(self.latencies, 95), 1),
+            "recent_events": self.events[-10:],
+        }
+
+    def run(self) -> dict:
+        with ProcessPoolExecutor(max_workers=max(1, self.args.workers)) as pool:
+            while True:
+                self.detect()
+                self.dispatch(pool)
+                self.collect()
+                if self.uploads:
+                    self.upload()
+                status = self.status()
+                self.args.status_file.write_text(json.dumps(status, ensure_ascii=False, indent=2), encoding="utf-8")
+                if self.args.once and status["queue_depth"] == 0:
+                    return status
+                time.sleep(self.args.interval)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input-dir", required=True, type=Path)
+    parser.add_argument("--base-url", default="http://127.0.0.1:9700")
+    parser.add_argument(
+        "--map-file",
+        type=Path,
+        default=Path("config/pua_replacements.json"),
+    )
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between directory scans.")
+    parser.add_argument("--debounce", type=float, default=10.0, help="Seconds a file must stay unchanged.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--state-file", type=Path, default=Path("ingest_watch_state.json"))
+    parser.add_argument("--status-file", type=Path, default=Path("ingest_watch_status.json"))
+    parser.add_argument("--ingest-existing", action="store_true", help="Ingest files already present on first start.")
+    parser.add_argument("--once", action="store_true", help="Exit once the queue is empty (cron-style run).")
+    args = parser.parse_args()
+
+    if not args.input_dir.exists():
+        raise FileNotFoundError(f"Input dir does not exist: {args.input_dir}")
+
+    watcher = IngestWatcher(args)
+    if not args.state_file.exists() and not args.ingest_existing:
+        watcher.baseline()
+    try:
+        status = watcher.run()
+    except KeyboardInterrupt:
+        status = watcher.status()
+    print(json.dumps({k: v for k, v in status.items() if k != "recent_events"}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
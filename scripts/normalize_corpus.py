@@ -40,6 +40,10 @@ def load_map(path: Path) -> Dict[str, str]:
         data = json.load(f)
     if not isinstance(data, dict):
         raise ValueError("Replacement map must be a JSON object.")
+    # null is the validate_corpus --map-template placeholder; "" would silently delete the character.
+    unfilled = [f"U+{ord(k[0]):04X}" if k else repr(k) for k, v in data.items() if v is None or v == "" or v == k]
+    if unfilled:
+        raise ValueError(f"Replacement map {path} has unfilled entries: {', '.join(unfilled)}")
     return {str(k): str(v) for k, v in data.items()}
 
 
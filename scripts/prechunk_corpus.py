@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Table-aware pre-chunking of normalized corpus text.
+
+Run after normalize_corpus.py (or extract_pdf_text.py). For each .txt file:
+- tracks pages from [[PAGE n]] markers
+- detects section headings and table blocks (pipe/tab/column-aligned rows,
+  "표 n" captions, a text header row above numeric rows)
+- packs whole sections and tables into chunks of at most --max-tokens; a
+  table that does not fit is split only between rows, with its caption and
+  header row repeated, never inside a row
+- attaches project / file / page / section metadata to every chunk; the
+  file is its path under --input-dir joined with "__" (as in ingest_watch)
+- reports chunk counts against LightRAG's fixed-size token chunking
+- optionally uploads chunks through /documents/texts (one text per chunk)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import re
+import urllib.request
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from extract_pdf_text import PAGE_MARKER_RE
+from ingest_watch import upload_name
+from run_strict_project_queries import canonical_project_name
+from token_estimate import estimate_tokens
+
+HEADING_RE = re.compile(r"^(?:제\s*\d+\s*[장절편]|[IVX]+\.\s+\S|[가-하]\.\s+\S|[①-⑳]\s*\S)")
+# "1 개요", "3.2.1 해석 결과": a section number followed by a title word.
+NUMBERED_HEADING_RE = re.compile(r"^\d+(?:\.\d+){0,3}\.?\s+(\S+)")
+HAS_LETTER_RE = re.compile(r"[^\W\d_]")
+SENTENCE_END_RE = re.compile(r"다\.?$")
+UNITS = {"%", "mm", "cm", "m", "kn", "mpa", "gpa", "sec", "s", "g", "kg", "kgf", "tf", "ton", "gal", "hz"}
+CAPTION_RE = re.compile(r"^\s*[<\[]?\s*(?:표|Table)\s*[\d\-.]+")
+NUMERIC_RE = re.compile(r"^[-+]?[\d,.]+(?:%|mm|cm|m|kN|MPa|sec|s|g)?$")
+COLUMN_SPLIT_RE = re.compile(r"\t|\s{2,}")
+
+
+@dataclass
+class Block:
+    kind: str  # "heading" | "table" | "text"
+    lines: list[str]
+    page: int
+    tokens: list[int] = field(default_factory=list)
+    head_rows: int = 0  # tables: leading caption/header lines repeated in continuations
+
+
+@dataclass
+class Chunk:
+    text: str
+    tokens: int
+    page_start: int
+    page_end: int
+    section: str
+    has_table: bool
+
+
+def table_cells(line: str) -> list[str]:
+    s = line.strip()
+    if s.count("|") >= 2:
+        return [c.strip() for c in s.strip("|").split("|")]
+    return [c for c in COLUMN_SPLIT_RE.split(s) if c]
+
+
+def is_numeric_row(cells: list[str]) -> bool:
+    return sum(1 for c in cells if NUMERIC_RE.match(c)) * 2 >= len(cells)
+
+
+def is_table_row(line: str) -> bool:
+    s = line.strip()
+    if s.count("|") >= 2:
+        return True
+    cells = table_cells(s)
+    return len(cells) >= 3 and is_numeric_row(cells)
+
+
+def is_header_row(line: str, first_row: str) -> bool:
+    """A text row with the same columns as the numeric rows below it (e.g. "부재  fck(MPa)  fy(MPa)")."""
+    cells = table_cells(line)
+    return (
+        len(cells) >= 2
+        and len(cells) == len(table_cells(first_row))
+        and not is_numeric_row(cells)
+        and max(len(c) for c in cells) <= 40
+    )
+
+
+def is_heading(line: str) -> bool:
+    s = line.strip()
+    if not 0 < len(s) <= 60 or is_table_row(s) or SENTENCE_END_RE.search(s):
+        return False
+    m = NUMBERED_HEADING_RE.match(s)
+    if m is None:
+        return bool(HEADING_RE.match(s))
+    # Reject "3.5 MPa 이상..." (a value, not a section number) and "1 2 3" (number rows).
+    title = m.group(1).strip("()[],.:")
+    if not HAS_LETTER_RE.search(title) or title.casefold() in UNITS:
+        return False
+    rest = s.split()[1:]
+    return sum(1 for w in rest if NUMERIC_RE.match(w)) * 2 < len(rest)
+
+
+def split_table_head(lines: list[str], first_row: str) -> list[str]:
+    """Pop the header row and caption directly above a table's first row off `lines`."""
+    head: list[str] = []
+    if lines and is_header_row(lines[-1], first_row):
+        head.insert(0, lines.pop())
+    if lines and CAPTION_RE.match(lines[-1]):
+        head.insert(0, lines.pop())
+    return head
+
+
+def parse_blocks(text: str) -> list[Block]:
+    blocks: list[Block] = []
+    page = 1
+    current: Block | None = None
+
+    def flush() -> None:
+        nonlocal current
+        if current and current.lines:
+            blocks.append(current)
+        current = None
+
+    for line in text.splitlines():
+        marker = PAGE_MARKER_RE.match(line.strip())
+        if marker:
+            page = int(marker.group(1))
+            if current and current.kind == "text":
+                flush()
+            continue
+        if not line.strip():
+            if current and current.kind == "text":
+                flush()
+            continue
+        if is_table_row(line):
+            if current is None or current.kind != "table":
+                # A header row and caption directly above the rows (blank lines allowed) belong to the table.
+                source = current if current is not None else (blocks[-1] if blocks else None)
+                head = split_table_head(source.lines, line) if source is not None and source.kind == "text" else []
+                if source is not None and source is not current and not source.lines:
+                    blocks.pop()
+                flush()
+                has_header = bool(head) and not CAPTION_RE.match(head[-1])
+                current = Block("table", head, page)
+                # Without a text header, a non-numeric first row (pipe tables) is the header.
+                current.head_rows = len(head) + (0 if has_header or is_numeric_row(table_cells(line)) else 1)
+            current.lines.append(line.rstrip())
+            continue
+        if current and current.kind == "table":
+            flush()
+        if is_heading(line):
+            flush()
+            blocks.append(Block("heading", [line.strip()], page))
+            continue
+        if current is None:
+            current = Block("text", [], page)
+        current.lines.append(line.rstrip())
+    flush()
+    for b in blocks:
+        b.tokens = [estimate_tokens(line) + 1 for line in b.lines]
+    return blocks
+
+
+class ChunkBuilder:
+    def __init__(self, max_tokens: int, min_tokens: int = 0):
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.chunks: list[Chunk] = []
+        self.section = ""
+        self._start_section = ""
+        self._lines: list[str] = []
+        self._tokens = 0
+        self._pages: list[int] = []
+        self._has_table = False
+
+    def flush(self) -> None:
+        if self._lines:
+            self.chunks.append(
+                Chunk(
+                    text="\n".join(self._lines),
+                    tokens=self._tokens,
+                    page_start=min(self._pages),
+                    page_end=max(self._pages),
+                    section=self._start_section,
+                    has_table=self._has_table,
+                )
+            )
+        self._lines, self._tokens, self._pages, self._has_table = [], 0, [], False
+
+    def _add(self, lines: list[str], tokens: int, page: int, table: bool) -> None:
+        if not self._lines:
+            self._start_section = self.section
+        self._lines.extend(lines)
+        self._tokens += tokens
+        self._pages.append(page)
+        self._has_table = self._has_table or table
+
+    def add_heading(self, block: Block, section_tokens: int) -> None:
+        # Pack whole sections together while they fit; start a new chunk at a heading
+        # only when the section would overflow and little room is left anyway.
+        if self._tokens + section_tokens > self.max_tokens and self.max_tokens - self._tokens < self.min_tokens:
+            self.flush()
+        self.section = block.lines[0]
+        self._add(block.lines, sum(block.tokens), block.page, False)
+
+    def add_text(self, block: Block) -> None:
+        for line, tok in zip(block.lines, block.tokens):
+            if self._tokens + tok > self.max_tokens:
+                self.flush()
+            if tok > self.max_tokens:
+                # A single overlong line: cut by characters proportionally.
+                step = max(1, math.floor(len(line) * self.max_tokens / tok))
+                for i in range(0, len(line), step):
+                    piece = line[i : i + step]
+                    self._add([piece], estimate_tokens(piece), block.page, False)
+                    self.flush()
+                continue
+            self._add([line], tok, block.page, False)
+
+    def add_table(self, block: Block) -> None:
+        total = sum(block.tokens)
+        if self._tokens + total <= self.max_tokens:
+            self._add(block.lines, total, block.page, True)
+            return
+        if total <= self.max_tokens and self.max_tokens - self._tokens < total / 2:
+            # Less than half the table would fit here: keep it whole in a fresh chunk.
+            self.flush()
+            self._add(block.lines, total, block.page, True)
+            return
+        # Split between rows and repeat the caption/header rows (never a data row) in each continuation.
+        head_n = block.head_rows if block.head_rows < len(block.lines) else 0
+        head, head_tok = block.lines[:head_n], sum(block.tokens[:head_n])
+        if self._tokens + head_tok > self.max_tokens:
+            self.flush()
+        self._add(head, head_tok, block.page, True)
+        for line, tok in zip(block.lines[head_n:], block.tokens[head_n:]):
+            if self._tokens + tok > self.max_tokens:
+                self.flush()
+                self._add(head, head_tok, block.page, True)
+            self._add([line], tok, block.page, True)
+
+
+def chunk_text(text: str, max_tokens: int, min_tokens: int = 0, header_prefix: str = "") -> tuple[list[Chunk], list[Block]]:
+    blocks = parse_blocks(text)
+    # Keep room for the worst-case "[project | file | pages | section]" header line.
+    longest = max((b.lines[0] for b in blocks if b.kind == "heading"), key=len, default="")
+    reserve = estimate_tokens(f"[{header_prefix} | p.9999-9999 | {longest}]") + 1 if header_prefix else 0
+    builder = ChunkBuilder(max_tokens - reserve, min_tokens)
+    section_tokens = [0] * len(blocks)
+    running = 0
+    for i in range(len(blocks) - 1, -1, -1):
+        running += sum(blocks[i].tokens)
+        if blocks[i].kind == "heading":
+            section_tokens[i] = running
+            running = 0
+    for block, tokens in zip(blocks, section_tokens):
+        if block.kind == "heading":
+            builder.add_heading(block, tokens)
+        elif block.kind == "table":
+            builder.add_table(block)
+        else:
+            builder.add_text(block)
+    builder.flush()
+    return builder.chunks, blocks
+
+
+def naive_chunk_count(total_tokens: int, size: int, overlap: int) -> int:
+    if total_tokens <= size:
+        return 1
+    return math.ceil((total_tokens - overlap) / (size - overlap))
+
+
+def naive_tables_split(blocks: list[Block], size: int, overlap: int) -> int:
+    """Tables that no fixed-size window (start = k * (size - overlap)) fully contains."""
+    step = size - overlap
+    pos = 0
+    split = 0
+    for block in blocks:
+        span = sum(block.tokens)
+        if block.kind == "table":
+            start = (pos // step) * step
+            if pos + span > start + size:
+                split += 1
+        pos += span
+    return split
+
+
+def chunk_header(project: str, source: str, chunk: Chunk) -> str:
+    pages = f"p.{chunk.page_start}" if chunk.page_start == chunk.page_end else f"p.{chunk.page_start}-{chunk.page_end}"
+    section = f" | {chunk.section}" if chunk.section else ""
+    return f"[{project} | {source} | {pages}{section}]"
+
+
+def upload_texts(base_url: str, texts: list[str], sources: list[str]) -> dict:
+    body = json.dumps({"texts": texts, "file_sources": sources}).encode("utf-8")
+    req = urllib.request.Request(
+        f"{base_url.rstrip('/')}/documents/texts",
+        data=body,
+        headers={"Content-Type": "application/json; charset=utf-8"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=300) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input-dir", required=True, type=Path)
+    parser.add_argument("--output-file", type=Path, default=Path("prechunks.jsonl"))
+    parser.add_argument("--report-file", type=Path, default=Path("prechunk_report.json"))
+    parser.add_argument("--max-tokens", type=int, default=1200, help="Keep at or below server CHUNK_SIZE.")
+    parser.add_argument("--min-tokens", type=int, default=300, help="Start a new chunk at a heading when less room than this is left.")
+    parser.add_argument("--naive-chunk-size", type=int, help="Server CHUNK_SIZE for the comparison (default: --max-tokens).")
+    parser.add_argument("--naive-overlap", type=int, default=100, help="Server CHUNK_OVERLAP_SIZE for the comparison.")
+    parser.add_argument("--upload", action="store_true", help="Upload chunks via /documents/texts.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:9700")
+    args = parser.parse_args()
+
+    if not args.input_dir.exists():
+        raise FileNotFoundError(f"Input dir does not exist: {args.input_dir}")
+    if args.naive_chunk_size is None:
+        args.naive_chunk_size = args.max_tokens
+
+    details = []
+    with args.output_file.open("w", encoding="utf-8", newline="\n") as out:
+        for path in sorted(args.input_dir.rglob("*.txt")):
+            text = path.read_text(encoding="utf-8")
+            # Same naming as ingest_watch: same-named reports in different folders stay apart,
+            # and a project encoded in a folder name still reaches canonical_project_name.
+            name = upload_name(path, args.input_dir)
+            stem = Path(name).stem
+            project = canonical_project_name(name)
+            chunks, blocks = chunk_text(text, args.max_tokens, args.min_tokens, f"{project} | {stem}")
+            texts, sources = [], []
+            for i, chunk in enumerate(chunks):
+                header = chunk_header(project, stem, chunk)
+                out.write(
+                    json.dumps(
+                        {
+                            "source": str(path),
+                            "project": project,
+                            "chunk_index": i,
+                            "page_start": chunk.page_start,
+                            "page_end": chunk.page_end,
+                            "section": chunk.section,
+                            "has_table": chunk.has_table,
+                            "tokens": chunk.tokens,
+                            "text": f"{header}\n{chunk.text}",
+                        },
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+                texts.append(f"{header}\n{chunk.text}")
+                sources.append(f"{stem}#p{chunk.page_start}-c{i}")
+            if args.upload and texts:
+                upload_texts(args.base_url, texts, sources)
+
+            total_tokens = sum(sum(b.tokens) for b in blocks)
+            details.append(
+                {
+                    "path": str(path),
+                    "project": project,
+                    "tokens": total_tokens,
+                    "tables": sum(1 for b in blocks if b.kind == "table"),
+                    "headings": sum(1 for b in blocks if b.kind == "heading"),
+                    "chunks": len(chunks),
+                    "table_chunks": sum(1 for c in chunks if c.has_table),
+                    "naive_chunks": naive_chunk_count(total_tokens, args.naive_chunk_size, args.naive_overlap),
+                    "naive_tables_split": naive_tables_split(blocks, args.naive_chunk_size, args.naive_overlap),
+                }
+            )
+
+    chunks_total = sum(d["chunks"] for d in details)
+    naive_total = sum(d["naive_chunks"] for d in details)
+    report = {
+        "input_dir": str(args.input_dir),
+        "files_scanned": len(details),
+        "max_tokens": args.max_tokens,
+        "chunks": chunks_total,
+        "naive_chunks": naive_total,
+        "chunk_reduction": round(1 - chunks_total / naive_total, 4) if naive_total else 0.0,
+        "tables": sum(d["tables"] for d in details),
+        "naive_tables_split": sum(d["naive_tables_split"] for d in details),
+        "uploaded": args.upload,
+        "details": details,
+    }
+    args.report_file.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(json.dumps({k: report[k] for k in report if k != "details"}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
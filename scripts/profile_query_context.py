@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Profile how much context each evaluation query pulls into the LLM prompt.
+
+For each question x project x retrieval preset:
+- request the assembled prompt with only_need_prompt=true
+- count prompt tokens and split them into entity / relation / chunk sections
+- flag rows that reach the preset's Max Entity/Relation/Total Tokens caps
+- optionally time the real /query call and correlate prompt size with latency
+- write a markdown report and a JSON report with per-row detail
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+
+from run_strict_project_queries import (
+    RETRIEVAL_PRESETS,
+    call_query,
+    extract_questions,
+    get_projects,
+)
+from query_client import get_client, percentile
+from sweep_retrieval_params import parse_list
+from token_estimate import estimate_tokens
+
+# Section headers of the LightRAG context template (current and pre-1.4 layouts).
+SECTION_RES = {
+    "entities": re.compile(r"^(?:Knowledge Graph Data \(Entity\)|-----Entities(?:\(KG\))?-----)", re.M),
+    "relations": re.compile(r"^(?:Knowledge Graph Data \(Relationship\)|-----Relationships(?:\(KG\))?-----)", re.M),
+    "chunks": re.compile(r"^(?:Document Chunks|-----Document Chunks(?:\(DC\))?-----|-----Sources-----)", re.M),
+    "references": re.compile(r"^Reference Document List", re.M),
+}
+CAP_FIELDS = {
+    "entities": "max_entity_tokens",
+    "relations": "max_relation_tokens",
+    "total": "max_total_tokens",
+}
+
+
+def split_prompt_sections(prompt: str) -> dict[str, str]:
+    """Split the assembled prompt into context sections; everything else is 'other'."""
+    marks: list[tuple[int, str]] = []
+    for name, pattern in SECTION_RES.items():
+        m = pattern.search(prompt)
+        if m:
+            marks.append((m.start(), name))
+    marks.sort()
+    sections = {name: "" for name in SECTION_RES}
+    other = prompt[: marks[0][0]] if marks else prompt
+    for i, (start, name) in enumerate(marks):
+        end = marks[i + 1][0] if i + 1 < len(marks) else len(prompt)
+        sections[name] = prompt[start:end]
+    sections["other"] = other
+    return sections
+
+
+def profile_prompt(prompt: str, params: dict, cap_ratio: float) -> dict:
+    sections = split_prompt_sections(prompt)
+    tokens = {name: estimate_tokens(text) for name, text in sections.items()}
+    tokens["total"] = estimate_tokens(prompt)
+    cap_hits = [
+        name
+        for name, field in CAP_FIELDS.items()
+        if params.get(field) and tokens[name] >= cap_ratio * params[field]
+    ]
+    return {"tokens": tokens, "cap_hits": cap_hits}
+
+
+def safe_correlation(xs: list[float], ys: list[float]) -> float | None:
+    if len(xs) < 3 or len(set(xs)) < 2 or len(set(ys)) < 2:
+        return None
+    return statistics.correlation(xs, ys)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quality-md", required=True, type=Path)
+    parser.add_argument("--output-md", default=Path("LightRAG 컨텍스트 프로파일.md"), type=Path)
+    parser.add_argument("--report-file", default=Path("context_profile.json"), type=Path)
+    parser.add_argument("--base-url", default="http://127.0.0.1:9700")
+    parser.add_argument("--presets", default=",".join(RETRIEVAL_PRESETS), help="Comma-separated preset names.")
+    parser.add_argument("--modes", default="", help="Override preset modes (comma-separated); default uses each preset's mode.")
+    parser.add_argument("--projects", default="", help="Comma-separated subset of projects (default: all processed).")
+    parser.add_argument("--questions", default="", help="Comma-separated question numbers (default: all).")
+    parser.add_argument("--cap-ratio", type=float, default=0.95, help="Fraction of a cap that counts as hitting it.")
+    parser.add_argument("--skip-latency", action="store_true", help="Only fetch prompts; do not time full /query calls.")
+    args = parser.parse_args()
+    # Hedged duplicates would hide the latency this profile correlates with prompt size.
+    get_client(args.base_url, hedge_budget=0)
+
+    questions = extract_questions(args.quality_md.read_text(encoding="utf-8"))
+    if args.questions:
+        wanted = set(parse_list(args.questions, int))
+        questions = [(no, q) for no, q in questions if no in wanted]
+    if not questions:
+        raise RuntimeError("No questions selected.")
+
+    projects = parse_list(args.projects, str) or get_projects(args.base_url)
+    if not projects:
+        raise RuntimeError("No processed projects found from /documents endpoint.")
+
+    presets = parse_list(args.presets, str)
+    unknown = [p for p in presets if p not in RETRIEVAL_PRESETS]
+    if unknown:
+        raise ValueError(f"Unknown presets: {unknown}")
+    modes = parse_list(args.modes, str)
+
+    rows = []
+    for preset in presets:
+        for mode in modes or [RETRIEVAL_PRESETS[preset]["mode"]]:
+            params = dict(RETRIEVAL_PRESETS[preset], mode=mode)
+            for no, q in questions:
+                for project in projects:
+                    resp = call_query(args.base_url, q, project, mode, dict(params, only_need_prompt=True))
+                    prompt = str(resp.get("response") or "")
+                    profile = profile_prompt(prompt, params, args.cap_ratio)
+                    latency = None
+                    if not args.skip_latency:
+                        start = time.perf_counter()
+                        call_query(args.base_url, q, project, mode, params)
+                        latency = time.perf_counter() - start
+                    rows.append(
+                        {
+                            "no": no,
+                            "project": project,
+                            "preset": preset,
+                            "mode": mode,
+                            "tokens": profile["tokens"],
+                            "cap_hits": profile["cap_hits"],
+                            "latency_sec": latency,
+                        }
+                    )
+                    print(f"[profile] {preset}/{mode} #{no} {project}: {profile['tokens']['total']} tokens", flush=True)
+
+    groups: dict[tuple[str, str], list[dict]] = {}
+    for r in rows:
+        groups.setdefault((r["preset"], r["mode"]), []).append(r)
+
+    summaries = []
+    for (preset, mode), group in groups.items():
+        totals = [r["tokens"]["total"] for r in group]
+        timed = [r for r in group if r["latency_sec"] is not None]
+        summaries.append(
+            {
+                "preset": preset,
+                "mode": mode,
+                "rows": len(group),
+                "mean_total_tokens": sum(totals) / len(totals),
+                "p95_total_tokens": percentile(totals, 95),
+                "mean_entity_tokens": sum(r["tokens"]["entities"] for r in group) / len(group),
+                "mean_relation_tokens": sum(r["tokens"]["relations"] for r in group) / len(group),
+                "mean_chunk_tokens": sum(r["tokens"]["chunks"] for r in group) / len(group),
+                "cap_hits": {name: sum(1 for r in group if name in r["cap_hits"]) for name in CAP_FIELDS},
+                "latency_token_corr": safe_correlation(
+                    [r["tokens"]["total"] for r in timed], [r["latency_sec"] for r in timed]
+                ),
+            }
+        )
+
+    timed_rows = [r for r in rows if r["latency_sec"] is not None]
+    overall_corr = safe_correlation(
+        [r["tokens"]["total"] for r in timed_rows], [r["latency_sec"] for r in timed_rows]
+    )
+
+    def fmt_corr(value: float | None) -> str:
+        return "-" if value is None else f"{value:.2f}"
+
+    out = []
+    out.append("# LightRAG 컨텍스트 프로파일")
+    out.append("")
+    out.append("기준")
+    out.append("- only_need_prompt=true로 조립된 프롬프트를 받아 토큰 수 측정")
+    out.append("- 엔티티/관계/청크 구간은 컨텍스트 섹션 헤더 기준으로 분리, 나머지는 기타(시스템 지시문 등)")
+    out.append(f"- 상한 도달: 구간 토큰 >= 프리셋 상한 x {args.cap_ratio}")
+    out.append(f"- 프롬프트 크기-지연 상관계수(전체): {fmt_corr(overall_corr)}")
+    out.append("")
+    out.append("## 프리셋별 요약")
+    out.append("")
+    out.append("| 프리셋 | 모드 | 건수 | 평균 총토큰 | p95 총토큰 | 평균 엔티티 | 평균 관계 | 평균 청크 | 엔티티 상한 | 관계 상한 | 총 상한 | 지연 상관 |")
+    out.append("|---|---|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|")
+    for s in summaries:
+        out.append(
+            f"| {s['preset']} | {s['mode']} | {s['rows']} | {s['mean_total_tokens']:.0f} | "
+            f"{s['p95_total_tokens']:.0f} | {s['mean_entity_tokens']:.0f} | {s['mean_relation_tokens']:.0f} | "
+            f"{s['mean_chunk_tokens']:.0f} | {s['cap_hits']['entities']} | {s['cap_hits']['relations']} | "
+            f"{s['cap_hits']['total']} | {fmt_corr(s['latency_token_corr'])} |"
+        )
+    out.append("")
+    out.append("## 문항별 상세")
+    out.append("")
+    out.append("| No | 대상 프로젝트 | 프리셋 | 모드 | 총토큰 | 엔티티 | 관계 | 청크 | 기타 | 상한 도달 | 지연(s) |")
+    out.append("|---:|---|---|---|---:|---:|---:|---:|---:|---|---:|")
+    for r in rows:
+        t = r["tokens"]
+        latency = "-" if r["latency_sec"] is None else f"{r['latency_sec']:.1f}"
+        out.append(
+            f"| {r['no']} | {r['project']} | {r['preset']} | {r['mode']} | {t['total']} | {t['entities']} | "
+            f"{t['relations']} | {t['chunks']} | {t['other']} | {', '.join(r['cap_hits']) or '-'} | {latency} |"
+        )
+    out.append("")
+
+    args.output_md.write_text("\n".join(out), encoding="utf-8", newline="\n")
+    report = {
+        "cap_ratio": args.cap_ratio,
+        "latency_token_corr": overall_corr,
+        "summaries": summaries,
+        "rows": rows,
+    }
+    args.report_file.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(
+        json.dumps(
+            {
+                "rows": len(rows),
+                "cap_hit_rows": sum(1 for r in rows if r["cap_hits"]),
+                "latency_token_corr": None if overall_corr is None else round(overall_corr, 3),
+                "output": str(args.output_md),
+            },
+            ensure_ascii=False,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
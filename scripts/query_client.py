@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+/query client with adaptive timeouts and hedged requests.
+
+Replaces the fixed per-call urlopen timeouts (180/240/300 s) of the
+evaluation scripts:
+- latencies are learned per key (the query mode) over a rolling window
+- until a mode has min_samples finished calls, the old fixed timeout applies;
+  afterwards the timeout is p99 x timeout factor, clamped to [min, initial]
+- a call still running past the mode's p95 gets one hedged duplicate, and the
+  first response wins; hedges are capped at --hedge-budget of all calls
+- every attempt (hedge losers included) records its own latency, and a
+  timed-out attempt is recorded at its timeout, so stuck generations widen
+  the distribution instead of being forgotten
+
+Scripts share one client per base URL through get_client().
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_INITIAL_TIMEOUT = 300.0
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = math.floor(k)
+    hi = math.ceil(k)
+    if lo == hi:
+        return ordered[lo]
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class AdaptiveQueryClient:
+    """Thread-safe JSON POST client; see the module docstring for the policy."""
+
+    def __init__(
+        self,
+        base_url: str,
+        initial_timeout: float = DEFAULT_INITIAL_TIMEOUT,
+        min_timeout: float = 60.0,
+        timeout_factor: float = 3.0,
+        hedge_pct: float = 95.0,
+        hedge_budget: float = 0.1,
+        min_samples: int = 5,
+        window: int = 200,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min(min_timeout, initial_timeout)
+        self.timeout_factor = timeout_factor
+        self.hedge_pct = hedge_pct
+        self.hedge_budget = hedge_budget
+        self.min_samples = min_samples
+        self.window = window
+        self._lock = threading.Lock()
+        self._latencies: dict[str, deque] = {}
+        self._counts: dict[str, dict[str, int]] = {}
+        self._requests = 0
+        self._hedges = 0
+        # Losing attempts are not cancelled (urllib cannot abort a read); they
+        # end at their own socket timeout, so the pool needs headroom.
+        self._pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="query")
+
+    def _samples(self, key: str) -> list[float]:
+        with self._lock:
+            return list(self._latencies.get(key, ()))
+
+    def timeout_for(self, key: str) -> float:
+        samples = self._samples(key)
+        if len(samples) < self.min_samples:
+            return self.initial_timeout
+        learned = percentile(samples, 99) * self.timeout_factor
+        return min(self.initial_timeout, max(self.min_timeout, learned))
+
+    def hedge_delay(self, key: str) -> float | None:
+        samples = self._samples(key)
+        if len(samples) < self.min_samples or self.hedge_budget <= 0:
+            return None
+        return percentile(samples, self.hedge_pct)
+
+    def _count(self, key: str, field: str) -> None:
+        counts = self._counts.setdefault(key, {"requests": 0, "hedged": 0, "hedge_wins": 0, "timeouts": 0, "errors": 0})
+        counts[field] += 1
+
+    def _observe(self, key: str, latency: float) -> None:
+        self._latencies.setdefault(key, deque(maxlen=self.window)).append(latency)
+
+    def _take_hedge(self, key: str) -> bool:
+        with self._lock:
+            # One hedge of burst, then at most hedge_budget hedges per call.
+            if self._hedges >= self.hedge_budget * self._requests + 1:
+                return False
+            self._hedges += 1
+            self._count(key, "hedged")
+            return True
+
+    def _post(self, path: str, body: bytes, timeout: float, key: str) -> dict:
+        """One attempt; records its own latency, so losing attempts still count."""
+        req = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=body,
+            headers={"Content-Type": "application/json; charset=utf-8"},
+            method="POST",
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                raw = resp.read().decode("utf-8")
+        except TimeoutError:
+            with self._lock:
+                self._observe(key, timeout)
+            raise
+        with self._lock:
+            self._observe(key, time.perf_counter() - start)
+        return json.loads(raw) if raw.strip() else {}
+
+    def post_json(self, path: str, payload: dict, key: str = "default") -> dict:
+        body = json.dumps(payload).encode("utf-8")
+        timeout = self.timeout_for(key)
+        delay = self.hedge_delay(key)
+        with self._lock:
+            self._requests += 1
+            self._count(key, "requests")
+
+        start = time.perf_counter()
+        deadline = start + timeout
+        pending = {self._pool.submit(self._post, path, body, timeout, key): "primary"}
+        hedge_checked = delay is None
+        error: Exception | None = None
+        while pending:
+            until = deadline if hedge_checked else min(start + delay, deadline)
+            done, _ = wait(pending, timeout=max(0.0, until - time.perf_counter()), return_when=FIRST_COMPLETED)
+            for fut in done:
+                role = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as exc:  # the other attempt may still succeed
+                    error = exc
+                    continue
+                if role == "hedge":
+                    with self._lock:
+                        self._count(key, "hedge_wins")
+                return result
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if not hedge_checked and now >= start + delay:
+                hedge_checked = True
+                if self._take_hedge(key):
+                    pending[self._pool.submit(self._post, path, body, deadline - now, key)] = "hedge"
+
+        # A socket timeout inside an attempt is a timeout too, not a server error.
+        timed_out = bool(pending) or isinstance(error, TimeoutError)
+        with self._lock:
+            self._count(key, "timeouts" if timed_out else "errors")
+        if pending:
+            raise TimeoutError(f"{path} ({key}) did not answer within {timeout:.0f}s")
+        raise error
+
+    def query(self, payload: dict) -> dict:
+        key = str(payload.get("mode") or "default")
+        if payload.get("only_need_prompt"):
+            key += "/prompt"  # no LLM call: a different latency distribution
+        return self.post_json("/query", payload, key=key)
+
+    def stats(self) -> dict:
+        out = {}
+        with self._lock:
+            keys = list(self._counts)
+        for key in keys:
+            samples = self._samples(key)
+            with self._lock:
+                counts = dict(self._counts[key])
+            out[key] = {
+                **counts,
+                "p50_latency_sec": round(percentile(samples, 50), 2),
+                "p95_latency_sec": round(percentile(samples, 95), 2),
+                "timeout_sec": round(self.timeout_for(key), 1),
+            }
+        return out
+
+
+_CLIENTS: dict[str, AdaptiveQueryClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(base_url: str, **settings) -> AdaptiveQueryClient:
+    """Shared client per base URL; `settings` apply only when it is first created."""
+    key = base_url.rstrip("/")
+    with _CLIENTS_LOCK:
+        if key not in _CLIENTS:
+            _CLIENTS[key] = AdaptiveQueryClient(key, **settings)
+        return _CLIENTS[key]
+
+
+def add_client_args(parser, initial_timeout: float = DEFAULT_INITIAL_TIMEOUT, hedging: bool = True) -> None:
+    parser.add_argument(
+        "--initial-timeout",
+        type=float,
+        default=initial_timeout,
+        help="Per-call timeout until a mode has enough samples; also the upper bound.",
+    )
+    if hedging:
+        parser.add_argument("--hedge-budget", type=float, default=0.1, help="Max hedged duplicates per /query call (0 disables).")
+
+
+def client_from_args(args) -> AdaptiveQueryClient:
+    return get_client(args.base_url, initial_timeout=args.initial_timeout, hedge_budget=args.hedge_budget)
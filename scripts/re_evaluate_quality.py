@@ -3,21 +3,38 @@
 Re-run 10-question quality evaluation against LightRAG query API.
 
 - Reads questions from markdown table
-- Calls /query with hybrid mode
+- Calls /query with hybrid mode (adaptive timeout + hedging, see query_client)
 - Repairs mojibake in response/reference text when possible
-- Applies simple "standard" heuristic scoring
-- Rewrites result table and summary in the same markdown
+- Applies simple "standard" heuristic scoring; relevance and grounding use
+  TF-IDF weights built once over the whole run (each text tokenized once
+  through a shared token -> term cache with Korean particle stripping,
+  sparse dict vectors)
+- Flags answers that name entities unique to a project other than the one the
+  question names (entity_dictionary); such answers lose the no-hallucination
+  point
+- Stores the run in the eval_store SQLite DB and re-renders the result
+  table and summary in the same markdown from it
 """
 
 from __future__ import annotations
 
 import argparse
 import json
+import math
 import re
-import urllib.request
+import time
+from collections import Counter
+from functools import lru_cache
+from itertools import compress, repeat
 from pathlib import Path
 
+import eval_store
+from entity_dictionary import DEFAULT_DICTIONARY, ContaminationDetector, format_hits
+from query_client import add_client_args, client_from_args, get_client
+from run_strict_project_queries import get_projects
+
 QUESTION_ROW_RE = re.compile(r"^\|\s*(\d+)\s*\|")
+NON_WORD_RE = re.compile(r"[^0-9A-Za-z가-힣 ]+")
 STOPWORDS = {
     "및",
     "과",
@@ -44,6 +61,36 @@ STOPWORDS = {
     "후보",
     "최종",
 }
+# Longest first, so "에서" is stripped before "에". Endings that are also common
+# noun endings in the reports (가: 평가, 과: 결과, 이: 높이, 도: 강도) are left out.
+PARTICLES = (
+    "에서는",
+    "으로는",
+    "에서",
+    "으로",
+    "에게",
+    "까지",
+    "부터",
+    "보다",
+    "처럼",
+    "에는",
+    "에도",
+    "과의",
+    "와의",
+    "은",
+    "는",
+    "을",
+    "를",
+    "의",
+    "에",
+    "로",
+    "와",
+)
+# Thresholds for idf-weighted question-term coverage (same scale as the old overlap ratio).
+RELEVANCE_HIGH = 0.5
+RELEVANCE_LOW = 0.2
+# Answer/reference-chunk cosine below this means the answer is not grounded in its references.
+GROUNDING_MIN = 0.1
 
 
 def maybe_repair_mojibake(text: str) -> str:
@@ -58,15 +105,110 @@ def maybe_repair_mojibake(text: str) -> str:
 
 
 def toks(s: str) -> list[str]:
-    s = re.sub(r"[^0-9A-Za-z가-힣 ]+", " ", s)
+    s = NON_WORD_RE.sub(" ", s)
     return [t for t in s.split() if len(t) >= 2 and t not in STOPWORDS]
 
 
-def score_answer(question: str, answer: str, ref_count: int) -> tuple[int, int, int, int]:
-    qtok = set(toks(question))
-    atok = set(toks(answer))
-    overlap = len(qtok & atok)
-    rel_ratio = overlap / max(1, len(qtok))
+@lru_cache(maxsize=None)
+def strip_particle(tok: str) -> str:
+    for p in PARTICLES:
+        if tok.endswith(p) and len(tok) - len(p) >= 2:
+            return tok[: -len(p)]
+    return tok
+
+
+def _term_of(tok: str) -> str:
+    if len(tok) < 2 or tok in STOPWORDS:
+        return ""
+    term = strip_particle(tok)
+    return "" if term in STOPWORDS else term
+
+
+# Raw token -> term ("" when dropped), shared by every text of the run.
+_TERMS: dict[str, str] = {}
+
+
+@lru_cache(maxsize=4096)
+def terms(s: str) -> tuple[str, ...]:
+    raw = NON_WORD_RE.sub(" ", s).split()
+    # Only unseen tokens go through Python; the lookup itself runs in map/filter.
+    for tok in set(raw).difference(_TERMS):
+        _TERMS[tok] = _term_of(tok)
+    return tuple(filter(None, map(_TERMS.__getitem__, raw)))
+
+
+class TfidfScorer:
+    """TF-IDF over every question, answer and reference text of one run.
+
+    Vectors are (term -> weight, norm) pairs; weights are left unnormalized
+    and cosine divides by both norms.
+    """
+
+    def __init__(self, docs: list[str]):
+        # Term counts are kept per document, so each text is tokenized once.
+        self.counts = [Counter(terms(doc)) for doc in docs]
+        df: Counter = Counter()
+        for counts in self.counts:
+            df.update(counts.keys())
+        n = len(docs)
+        self.idf: dict[str, float] = {t: math.log((1 + n) / (1 + c)) + 1.0 for t, c in df.items()}
+
+    def _weigh(self, tf: Counter) -> tuple[dict[str, float], float]:
+        idf = self.idf
+        # Most terms occur once (weight = idf): build those with map/zip, then
+        # fix up the repeated ones, picked out by compress, in Python.
+        vec = dict(zip(tf, map(idf.get, tf, repeat(1.0))))
+        for t in compress(tf, map((1).__lt__, tf.values())):
+            vec[t] *= 1 + math.log(tf[t])
+        return vec, math.hypot(*vec.values()) or 1.0
+
+    def vector(self, s: str) -> tuple[dict[str, float], float]:
+        return self._weigh(Counter(terms(s)))
+
+    def doc_vector(self, i: int) -> tuple[dict[str, float], float]:
+        """Vector of the i-th document the scorer was built from."""
+        return self._weigh(self.counts[i])
+
+    @staticmethod
+    def cosine(a: tuple[dict[str, float], float], b: tuple[dict[str, float], float]) -> float:
+        (va, na), (vb, nb) = a, b
+        # The key intersection runs in C; only shared terms reach the Python loop.
+        return sum(va[t] * vb[t] for t in va.keys() & vb.keys()) / (na * nb)
+
+    def coverage(self, question: str, answer_terms) -> float:
+        """Share of the question's idf weight whose terms appear in the answer."""
+        qterms = set(terms(question))
+        total = sum(self.idf.get(t, 1.0) for t in qterms)
+        hit = sum(self.idf.get(t, 1.0) for t in qterms if t in answer_terms)
+        return hit / total if total else 0.0
+
+
+def batch_similarities(questions: list[str], answers: list[str], ref_texts: list[str]) -> list[tuple[float, float | None]]:
+    """Return (question coverage, answer-reference cosine or None) per row."""
+    n = len(questions)
+    ref_rows = [i for i, r in enumerate(ref_texts) if r]
+    scorer = TfidfScorer(questions + answers + [ref_texts[i] for i in ref_rows])
+    ref_pos = {row: 2 * n + k for k, row in enumerate(ref_rows)}
+    out = []
+    for i, q in enumerate(questions):
+        avec = scorer.doc_vector(n + i)
+        grounding = scorer.cosine(avec, scorer.doc_vector(ref_pos[i])) if i in ref_pos else None
+        out.append((scorer.coverage(q, avec[0]), grounding))
+    return out
+
+
+def score_answer(
+    question: str,
+    answer: str,
+    ref_count: int,
+    similarity: float | None = None,
+    grounding: float | None = None,
+    foreign_entities: int = 0,
+) -> tuple[int, int, int, int]:
+    if similarity is None:
+        qtok = set(toks(question))
+        atok = set(toks(answer))
+        similarity = len(qtok & atok) / max(1, len(qtok))
 
     if ref_count >= 2:
         evidence = 3
@@ -74,16 +216,18 @@ def score_answer(question: str, answer: str, ref_count: int) -> tuple[int, int,
         evidence = 2
     else:
         evidence = 0
+    if evidence and grounding is not None and grounding < GROUNDING_MIN:
+        evidence -= 1
 
-    if rel_ratio >= 0.5:
+    if similarity >= RELEVANCE_HIGH:
         relevance = 2
-    elif rel_ratio >= 0.2:
+    elif similarity >= RELEVANCE_LOW:
         relevance = 1
     else:
         relevance = 0
 
     halluc_free = 1
-    if ("\ufffd" in answer) or ("수서중학교" in answer and "안동중앙고" in question):
+    if "\ufffd" in answer or foreign_entities:
         halluc_free = 0
 
     accuracy = 1
@@ -111,15 +255,67 @@ def extract_questions(md: str) -> list[tuple[int, str]]:
 
 
 def call_query(base_url: str, question: str, mode: str) -> dict:
-    payload = json.dumps({"query": question, "mode": mode}).encode("utf-8")
-    req = urllib.request.Request(
-        f"{base_url}/query",
-        data=payload,
-        headers={"Content-Type": "application/json; charset=utf-8"},
-        method="POST",
-    )
-    with urllib.request.urlopen(req, timeout=180) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+    payload = {"query": question, "mode": mode, "include_references": True, "include_chunk_content": True}
+    return get_client(base_url).query(payload)
+
+
+def summarize_results(results: list[dict]) -> dict:
+    total_score = sum(r["total"] for r in results)
+    avg = total_score / len(results) if results else 0.0
+    p_count = sum(1 for r in results if r["pf"] == "P")
+    ref_missing = sum(1 for r in results if r["refs"] == "없음")
+    return {
+        "total_score": total_score,
+        "average": round(avg, 1),
+        "pass_items": p_count,
+        "fail_items": len(results) - p_count,
+        "ref_missing": ref_missing,
+        "final": "PASS" if (avg >= 8.0 and p_count >= 8 and ref_missing <= 2) else "FAIL",
+    }
+
+
+def render_report(run: dict, results: list[dict]) -> str:
+    """Render the quality markdown from one stored run (see eval_store)."""
+    summary = summarize_results(results)
+    out = []
+    out.append("# LightRAG 품질 검증표 (10문항)")
+    out.append("")
+    out.append("검증 기준(문항당 10점)")
+    out.append("- 정확성: 0~4")
+    out.append("- 근거성(References 연계성): 0~3")
+    out.append("- 질문 충족도: 0~2")
+    out.append("- 환각 없음: 0~1")
+    out.append("")
+    out.append("합격 기준(권장)")
+    out.append("- 문항 평균 8.0점 이상")
+    out.append("- 환각 없음 항목 10문항 중 8개 이상")
+    out.append("- References 누락 문항 2개 이하")
+    out.append("")
+    out.append("| No | 질문 | 응답 요약 | References(파일/근거) | 정확성(0~4) | 근거성(0~3) | 질문충족(0~2) | 환각없음(0~1) | 합계(10) | 판정(P/F) | 외부프로젝트 엔티티 | 비고 |")
+    out.append("|---|---|---|---|---:|---:|---:|---:|---:|---|---|---|")
+    for r in results:
+        out.append(
+            f"| {r['no']} | {r['question']} | {r['summary']} | {r['refs']} | "
+            f"{r['accuracy']} | {r['evidence']} | {r['relevance']} | {r['nofab']} | "
+            f"{r['total']} | {r['pf']} | {r.get('foreign_entities') or '-'} | 자동채점(표준) |"
+        )
+    out.append("")
+    out.append("## 집계")
+    out.append(f"- 총점: {summary['total_score']}/100")
+    out.append(f"- 평균점: {summary['average']:.1f}/10")
+    out.append(f"- P 문항 수: {summary['pass_items']}")
+    out.append(f"- F 문항 수: {summary['fail_items']}")
+    out.append(f"- References 누락 문항 수: {summary['ref_missing']}")
+    out.append(f"- 최종 판정: {summary['final']}")
+    out.append("")
+    out.append("## 자동채점 결과")
+    out.append(f"- 질의 모드: {run['mode']}")
+    out.append("- 인코딩 복구(가능한 경우): latin1->utf-8 휴리스틱 적용")
+    out.append("- 질문충족: 질문 용어의 TF-IDF 가중 포함률(조사 제거), 근거성: 답변-참조청크 TF-IDF 유사도 반영")
+    out.append("- 환각없음: 질문 대상 프로젝트 외 프로젝트 고유 엔티티가 답변에 나오면 0점")
+    out.append("- 권장: 정규화/검증 스크립트 실행 후 동일 문항 재평가")
+    out.append("")
+    return "\n".join(out)
 
 
 def main() -> int:
@@ -127,24 +323,44 @@ def main() -> int:
     parser.add_argument("--quality-md", required=True, type=Path)
     parser.add_argument("--base-url", default="http://127.0.0.1:9700")
     parser.add_argument("--mode", default="hybrid")
+    parser.add_argument("--db", type=Path, default=eval_store.DEFAULT_DB, help="eval_store results database.")
+    parser.add_argument("--entity-dictionary", type=Path, default=DEFAULT_DICTIONARY)
+    add_client_args(parser, initial_timeout=180)
     args = parser.parse_args()
+    client = client_from_args(args)
 
     md = args.quality_md.read_text(encoding="utf-8")
     questions = extract_questions(md)
     if len(questions) != 10:
         raise RuntimeError(f"Expected 10 questions, got {len(questions)}")
 
-    results = []
+    rows = []
     for no, q in questions:
+        t0 = time.perf_counter()
         resp = call_query(args.base_url.rstrip("/"), q, args.mode)
+        latency = time.perf_counter() - t0
         answer = maybe_repair_mojibake((resp.get("response") or "").strip())
         refs = resp.get("references") or []
         ref_files = []
+        ref_chunks = []
         for r in refs[:3]:
             fp = maybe_repair_mojibake(str(r.get("file_path") or "")).strip()
             if fp:
                 ref_files.append(fp)
-        accuracy, evidence, relevance, nofab = score_answer(q, answer, len(ref_files))
+            content = r.get("content") or ""
+            if isinstance(content, list):
+                content = "\n".join(str(c) for c in content)
+            ref_chunks.append(maybe_repair_mojibake(str(content)))
+        rows.append((no, q, answer, ref_files, "\n".join(ref_chunks).strip(), latency))
+
+    detector = ContaminationDetector.load(args.entity_dictionary, get_projects(args.base_url))
+    sims = batch_similarities([r[1] for r in rows], [r[2] for r in rows], [r[4] for r in rows])
+
+    results = []
+    for (no, q, answer, ref_files, _, latency), (similarity, grounding) in zip(rows, sims):
+        targets = detector.projects_in(q)
+        foreign = detector.foreign_entities(answer, targets) if targets else []
+        accuracy, evidence, relevance, nofab = score_answer(q, answer, len(ref_files), similarity, grounding, len(foreign))
         total = accuracy + evidence + relevance + nofab
         pf = "P" if total >= 8 else "F"
         summary = answer.replace("\n", " ").strip()
@@ -162,67 +378,26 @@ def main() -> int:
                 "nofab": nofab,
                 "total": total,
                 "pf": pf,
+                "foreign_entities": format_hits(foreign),
+                "passed": pf == "P",
+                "score": total,
+                "latency_sec": round(latency, 3),
             }
         )
 
-    total_score = sum(r["total"] for r in results)
-    avg = total_score / len(results)
-    p_count = sum(1 for r in results if r["pf"] == "P")
-    f_count = len(results) - p_count
-    ref_missing = sum(1 for r in results if r["refs"] == "없음")
-    final = "PASS" if (avg >= 8.0 and p_count >= 8 and ref_missing <= 2) else "FAIL"
-
-    # Rebuild markdown deterministically.
-    out = []
-    out.append("# LightRAG 품질 검증표 (10문항)")
-    out.append("")
-    out.append("검증 기준(문항당 10점)")
-    out.append("- 정확성: 0~4")
-    out.append("- 근거성(References 연계성): 0~3")
-    out.append("- 질문 충족도: 0~2")
-    out.append("- 환각 없음: 0~1")
-    out.append("")
-    out.append("합격 기준(권장)")
-    out.append("- 문항 평균 8.0점 이상")
-    out.append("- 환각 없음 항목 10문항 중 8개 이상")
-    out.append("- References 누락 문항 2개 이하")
-    out.append("")
-    out.append("| No | 질문 | 응답 요약 | References(파일/근거) | 정확성(0~4) | 근거성(0~3) | 질문충족(0~2) | 환각없음(0~1) | 합계(10) | 판정(P/F) | 비고 |")
-    out.append("|---|---|---|---|---:|---:|---:|---:|---:|---|---|")
-    for r in results:
-        out.append(
-            f"| {r['no']} | {r['question']} | {r['summary']} | {r['refs']} | "
-            f"{r['accuracy']} | {r['evidence']} | {r['relevance']} | {r['nofab']} | "
-            f"{r['total']} | {r['pf']} | 자동채점(표준) |"
-        )
-    out.append("")
-    out.append("## 집계")
-    out.append(f"- 총점: {total_score}/100")
-    out.append(f"- 평균점: {avg:.1f}/10")
-    out.append(f"- P 문항 수: {p_count}")
-    out.append(f"- F 문항 수: {f_count}")
-    out.append(f"- References 누락 문항 수: {ref_missing}")
-    out.append(f"- 최종 판정: {final}")
-    out.append("")
-    out.append("## 자동채점 결과")
-    out.append("- 질의 모드: hybrid")
-    out.append("- 인코딩 복구(가능한 경우): latin1->utf-8 휴리스틱 적용")
-    out.append("- 권장: 정규화/검증 스크립트 실행 후 동일 문항 재평가")
-    out.append("")
-
-    args.quality_md.write_text("\n".join(out), encoding="utf-8", newline="\n")
-    print(
-        json.dumps(
-            {
-                "total_score": total_score,
-                "average": round(avg, 1),
-                "pass_items": p_count,
-                "fail_items": f_count,
-                "final": final,
-            },
-            ensure_ascii=False,
-        )
+    conn = eval_store.connect(args.db)
+    run_id = eval_store.record_run(
+        conn,
+        "re_evaluate_quality",
+        results,
+        mode=args.mode,
+        fingerprint=eval_store.index_fingerprint(args.base_url),
+        params={"quality_md": str(args.quality_md)},
+        summary={**summarize_results(results), "query_client": client.stats()},
     )
+    run = eval_store.load_run(conn, run_id)
+    args.quality_md.write_text(render_report(run, eval_store.load_rows(conn, run_id)), encoding="utf-8", newline="\n")
+    print(json.dumps({"run_id": run_id, **run["summary"]}, ensure_ascii=False))
     return 0
 
 
@@ -8,8 +8,11 @@ Workflow:
    - clear current index via /documents DELETE
    - upload only that PDF
    - wait until processing finishes
+   - snapshot /graph/label/list as that project's entity labels
    - run 10 evaluation questions
-   - record results (project-isolated, no cross-project contamination)
+   - record results (project-isolated, no cross-project contamination;
+     answers are scanned for entities unique to other projects)
+     in the eval_store SQLite DB; the markdown is rendered from it
 3) Optionally restore the full 4-project index
 """
 
@@ -24,6 +27,19 @@ import time
 import urllib.request
 from pathlib import Path
 
+import eval_store
+from batch_ingest import BatchIngestScheduler, IngestJob, upload_file
+from entity_dictionary import (
+    ContaminationDetector,
+    build_dictionary,
+    fetch_labels,
+    format_hits,
+    load_label_snapshot,
+    save_label_snapshot,
+)
+from ingest_progress import IngestProgressTracker
+from query_client import add_client_args, client_from_args, get_client
+
 QUESTION_ROW_RE = re.compile(r"^\|\s*(\d+)\s*\|")
 
 
@@ -65,51 +81,18 @@ def api_json(base_url: str, method: str, path: str, payload: dict | None = None)
     return json.loads(raw)
 
 
-def upload_pdf(base_url: str, file_path: Path) -> dict:
-    boundary = "----LightRAGBoundary7MA4YWxkTrZu0gW"
-    data = file_path.read_bytes()
-    header = (
-        f"--{boundary}\r\n"
-        f'Content-Disposition: form-data; name="file"; filename="{file_path.name}"\r\n'
-        "Content-Type: application/pdf\r\n\r\n"
-    ).encode("utf-8")
-    tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
-    body = header + data + tail
-    req = urllib.request.Request(
-        f"{base_url.rstrip('/')}/documents/upload",
-        data=body,
-        method="POST",
-        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
-    )
-    with urllib.request.urlopen(req, timeout=300) as resp:
-        return json.loads(resp.read().decode("utf-8"))
-
-
-def wait_pipeline_idle(base_url: str, timeout_sec: int = 3600) -> None:
-    start = time.time()
-    while True:
-        st = api_json(base_url, "GET", "/documents/pipeline_status")
-        busy = bool(st.get("busy", False))
-        if not busy:
-            return
-        if time.time() - start > timeout_sec:
-            raise TimeoutError("Pipeline did not become idle in time.")
-        time.sleep(5)
-
-
-def wait_doc_processed(base_url: str, expected_processed: int, timeout_sec: int = 14400) -> None:
-    start = time.time()
-    while True:
-        counts = api_json(base_url, "GET", "/documents/status_counts").get("status_counts", {})
-        processed = int(counts.get("PROCESSED", counts.get("processed", 0)))
-        failed = int(counts.get("FAILED", counts.get("failed", 0)))
-        processing = int(counts.get("PROCESSING", counts.get("processing", 0)))
-        pending = int(counts.get("PENDING", counts.get("pending", 0)))
-        if processed >= expected_processed and failed == 0 and processing == 0 and pending == 0:
-            return
-        if time.time() - start > timeout_sec:
-            raise TimeoutError(f"Document processing timeout. counts={counts}")
-        time.sleep(8)
+def wait_pipeline_idle(base_url: str, timeline_file: Path | None = None, stall_timeout: float = 1800) -> None:
+    IngestProgressTracker(base_url, timeline_file=timeline_file, stall_timeout=stall_timeout).wait_idle()
+
+
+def wait_doc_processed(
+    base_url: str,
+    expected_processed: int,
+    timeline_file: Path | None = None,
+    stall_timeout: float = 1800,
+) -> None:
+    tracker = IngestProgressTracker(base_url, timeline_file=timeline_file, stall_timeout=stall_timeout)
+    tracker.wait_processed(expected_processed)
 
 
 def extract_questions(path: Path) -> list[tuple[int, str]]:
@@ -136,7 +119,7 @@ def call_query(base_url: str, question: str, project: str) -> dict:
         "ll_keywords": [project, "내진보강", "구조", "성능평가"],
         "response_type": "Bullet Points",
     }
-    return api_json(base_url, "POST", "/query", payload)
+    return get_client(base_url).query(payload)
 
 
 def summarize_answer(answer: str) -> str:
@@ -158,6 +141,60 @@ def backup_source_pdfs(src_dir: Path, backup_dir: Path) -> list[Path]:
     return out
 
 
+def summarize_rows(rows: list[dict]) -> dict:
+    total = len(rows)
+    passed = sum(1 for r in rows if r["result"] == "P")
+    pass_rate = passed / total if total else 0
+    return {
+        "total": total,
+        "pass": passed,
+        "fail": total - passed,
+        "pass_rate": round(pass_rate, 4),
+        "final": "PASS" if pass_rate >= 0.8 else "FAIL",
+    }
+
+
+def render_report(run: dict, rows: list[dict]) -> str:
+    """Render the isolated-index markdown from one stored run (see eval_store)."""
+    summary = summarize_rows(rows)
+    out = []
+    out.append("# LightRAG 프로젝트별 분리인덱스 엄격 결과")
+    out.append("")
+    out.append("기준")
+    out.append("- 프로젝트별 단독 인덱스(해당 PDF 1개만 적재)로 질의")
+    out.append("- 대상 프로젝트 참조 >= 1")
+    out.append("- 외부 프로젝트 참조 = 0")
+    out.append("")
+    out.append(f"- 총 평가 건수: {summary['total']}")
+    out.append(f"- 통과: {summary['pass']}")
+    out.append(f"- 실패: {summary['fail']}")
+    out.append(f"- 통과율: {summary['pass_rate']:.1%}")
+    out.append(f"- 최종 판정: {summary['final']}")
+    out.append("")
+    out.append("| No | 대상 프로젝트 | 질문 | 응답 요약 | 대상참조수 | 외부참조수 | 참조 프로젝트 목록 | 답변 외부엔티티 | 판정 |")
+    out.append("|---:|---|---|---|---:|---:|---|---|---|")
+    for r in rows:
+        out.append(
+            f"| {r['no']} | {r['project']} | {r['question']} | {r['summary']} | "
+            f"{r['target_hits']} | {r['foreign_hits']} | {r['refs']} | "
+            f"{r.get('foreign_entities') or '-'} | {r['result']} |"
+        )
+    out.append("")
+    return "\n".join(out)
+
+
+def restore_full_index(args: argparse.Namespace, pdfs: list[Path]) -> None:
+    wait_pipeline_idle(args.base_url, args.timeline_file, args.stall_timeout)
+    api_json(args.base_url, "DELETE", "/documents")
+    wait_pipeline_idle(args.base_url, args.timeline_file, args.stall_timeout)
+    tracker = IngestProgressTracker(args.base_url, timeline_file=args.timeline_file, stall_timeout=args.stall_timeout)
+    jobs = [IngestJob(path=str(pdf), size=pdf.stat().st_size, est_chunks=0) for pdf in pdfs]
+    jobs.sort(key=lambda j: j.size, reverse=True)
+    restore = BatchIngestScheduler(args.base_url, args.max_in_flight, tracker=tracker).run(jobs)
+    if restore["failed"]:
+        raise RuntimeError(f"Full index restore failed for {restore['failed']} document(s).")
+
+
 def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--quality-md", required=True, type=Path)
@@ -166,7 +203,19 @@ def main() -> int:
     parser.add_argument("--source-dir", default=Path(r"C:\LightRAG\inputs\__enqueued__"), type=Path)
     parser.add_argument("--backup-dir", default=Path(r"C:\LightRAG\inputs\_split_index_backup"), type=Path)
     parser.add_argument("--restore-full-index", action="store_true")
+    parser.add_argument("--max-in-flight", type=int, default=2, help="Documents in flight during --restore-full-index.")
+    parser.add_argument("--timeline-file", default=Path("ingest_timeline.jsonl"), type=Path)
+    parser.add_argument(
+        "--stall-timeout",
+        type=float,
+        default=1800,
+        help="Fail when the pipeline shows no progress for this many seconds.",
+    )
+    parser.add_argument("--db", type=Path, default=eval_store.DEFAULT_DB, help="eval_store results database.")
+    parser.add_argument("--entity-snapshot", default=Path("entity_labels.json"), type=Path)
+    add_client_args(parser)
     args = parser.parse_args()
+    client = client_from_args(args)
 
     questions = extract_questions(args.quality_md)
     if len(questions) != 10:
@@ -176,16 +225,21 @@ def main() -> int:
     projects = [(project_name_from_filename(p.name), p) for p in pdfs]
 
     results = []
+    answers = []
     for project, pdf in projects:
-        wait_pipeline_idle(args.base_url, timeout_sec=1200)
+        wait_pipeline_idle(args.base_url, args.timeline_file, args.stall_timeout)
         api_json(args.base_url, "DELETE", "/documents")
-        wait_pipeline_idle(args.base_url, timeout_sec=1200)
+        wait_pipeline_idle(args.base_url, args.timeline_file, args.stall_timeout)
 
-        upload_pdf(args.base_url, pdf)
-        wait_doc_processed(args.base_url, expected_processed=1, timeout_sec=14400)
+        upload_file(args.base_url, pdf)
+        wait_doc_processed(args.base_url, 1, args.timeline_file, args.stall_timeout)
+        fingerprint = eval_store.index_fingerprint(args.base_url)
+        save_label_snapshot(args.entity_snapshot, project, fetch_labels(args.base_url))
 
         for no, q in questions:
+            t0 = time.perf_counter()
             resp = call_query(args.base_url, q, project)
+            latency = time.perf_counter() - t0
             answer = maybe_repair_mojibake(resp.get("response") or "")
             refs = resp.get("references") or []
             ref_names = [project_name_from_filename(str(r.get("file_path") or "")) for r in refs]
@@ -202,61 +256,49 @@ def main() -> int:
                     "foreign_hits": foreign_hits,
                     "refs": ", ".join(sorted(set(ref_names))) if ref_names else "없음",
                     "result": "P" if ok else "F",
+                    "passed": ok,
+                    "latency_sec": round(latency, 3),
+                    "index_fingerprint": fingerprint,
                 }
             )
-
-    if args.restore_full_index:
-        wait_pipeline_idle(args.base_url, timeout_sec=1200)
-        api_json(args.base_url, "DELETE", "/documents")
-        wait_pipeline_idle(args.base_url, timeout_sec=1200)
-        for _, pdf in projects:
-            upload_pdf(args.base_url, pdf)
-        wait_doc_processed(args.base_url, expected_processed=len(projects), timeout_sec=14400)
-
-    total = len(results)
-    passed = sum(1 for r in results if r["result"] == "P")
-    failed = total - passed
-    pass_rate = passed / total if total else 0
-    final = "PASS" if pass_rate >= 0.8 else "FAIL"
-
-    out = []
-    out.append("# LightRAG 프로젝트별 분리인덱스 엄격 결과")
-    out.append("")
-    out.append("기준")
-    out.append("- 프로젝트별 단독 인덱스(해당 PDF 1개만 적재)로 질의")
-    out.append("- 대상 프로젝트 참조 >= 1")
-    out.append("- 외부 프로젝트 참조 = 0")
-    out.append("")
-    out.append(f"- 총 평가 건수: {total}")
-    out.append(f"- 통과: {passed}")
-    out.append(f"- 실패: {failed}")
-    out.append(f"- 통과율: {pass_rate:.1%}")
-    out.append(f"- 최종 판정: {final}")
-    out.append("")
-    out.append("| No | 대상 프로젝트 | 질문 | 응답 요약 | 대상참조수 | 외부참조수 | 참조 프로젝트 목록 | 판정 |")
-    out.append("|---:|---|---|---|---:|---:|---|---|")
-    for r in results:
-        out.append(
-            f"| {r['no']} | {r['project']} | {r['question']} | {r['summary']} | "
-            f"{r['target_hits']} | {r['foreign_hits']} | {r['refs']} | {r['result']} |"
-        )
-    out.append("")
-
-    args.output_md.write_text("\n".join(out), encoding="utf-8", newline="\n")
+            answers.append(answer)
+
+    # Labels are only known to be project-unique once every project was indexed.
+    detector = ContaminationDetector(**build_dictionary([load_label_snapshot(args.entity_snapshot)], [p for p, _ in projects]))
+    for row, answer in zip(results, answers):
+        row["foreign_entities"] = format_hits(detector.foreign_entities(answer, {row["project"]}))
+
+    conn = eval_store.connect(args.db)
+    # Each project is queried against its own single-document index, so the
+    # fingerprint is kept per row rather than per run.
+    run_id = eval_store.record_run(
+        conn,
+        "run_isolated_project_evaluation",
+        results,
+        mode="local",
+        params={"projects": [p for p, _ in projects]},
+        summary={**summarize_rows(results), "query_client": client.stats()},
+    )
+    run = eval_store.load_run(conn, run_id)
+    args.output_md.write_text(render_report(run, eval_store.load_rows(conn, run_id)), encoding="utf-8", newline="\n")
     print(
         json.dumps(
             {
+                "run_id": run_id,
                 "projects": [p for p, _ in projects],
-                "total": total,
-                "pass": passed,
-                "fail": failed,
-                "pass_rate": round(pass_rate, 4),
-                "final": final,
+                **run["summary"],
                 "output": str(args.output_md),
             },
             ensure_ascii=False,
         )
     )
+
+    # The evaluation is already stored and reported; a failed restore must not lose it.
+    if args.restore_full_index:
+        try:
+            restore_full_index(args, [pdf for _, pdf in projects])
+        except Exception as exc:
+            raise RuntimeError(f"Run {run_id} was saved to {args.output_md}, but the full index restore failed: {exc}") from exc
     return 0
 
 
@@ -3,10 +3,14 @@
 Run strict project-aware evaluation.
 
 For each question and each detected project:
-- query LightRAG with strict retrieval profile
+- query LightRAG with strict retrieval profile (adaptive timeout + hedging,
+  see query_client)
 - force project scope in the prompt
 - verify whether references match the target project
-- write a markdown report with explicit project attribution
+- report entities unique to other projects that appear in the answer
+  (entity_dictionary)
+- store the run in the eval_store SQLite DB and render the markdown report
+  (explicit project attribution) from it
 """
 
 from __future__ import annotations
@@ -14,12 +18,47 @@ from __future__ import annotations
 import argparse
 import json
 import re
+import time
 import urllib.parse
 import urllib.request
 from pathlib import Path
 
+import eval_store
+from query_client import add_client_args, client_from_args, get_client
+
 QUESTION_ROW_RE = re.compile(r"^\|\s*(\d+)\s*\|")
 
+# Retrieval presets from README "Retrieval Presets (Recommended)".
+RETRIEVAL_PRESETS: dict[str, dict] = {
+    "default": {
+        "mode": "local",
+        "top_k": 16,
+        "chunk_top_k": 10,
+        "max_entity_tokens": 3000,
+        "max_relation_tokens": 3000,
+        "max_total_tokens": 12000,
+        "enable_rerank": True,
+    },
+    "table": {
+        "mode": "local",
+        "top_k": 12,
+        "chunk_top_k": 10,
+        "max_entity_tokens": 2500,
+        "max_relation_tokens": 2500,
+        "max_total_tokens": 10000,
+        "enable_rerank": True,
+    },
+    "graph": {
+        "mode": "hybrid",
+        "top_k": 20,
+        "chunk_top_k": 10,
+        "max_entity_tokens": 3000,
+        "max_relation_tokens": 3500,
+        "max_total_tokens": 14000,
+        "enable_rerank": True,
+    },
+}
+
 
 def maybe_repair_mojibake(text: str) -> str:
     try:
@@ -68,7 +107,8 @@ def get_projects(base_url: str) -> list[str]:
     return dedup
 
 
-def call_query(base_url: str, question: str, project: str, mode: str) -> dict:
+def build_query_payload(question: str, project: str, mode: str, params: dict | None = None) -> dict:
+    """Build the strict project-scoped /query payload; `params` overrides retrieval fields."""
     strict_query = (
         f"[대상 프로젝트: {project}] {question}\n"
         f"반드시 {project} 관련 근거만 사용하고 다른 프로젝트 정보는 제외하세요. "
@@ -86,15 +126,34 @@ def call_query(base_url: str, question: str, project: str, mode: str) -> dict:
         "ll_keywords": [project, "내진보강", "구조", "성능평가"],
         "response_type": "Bullet Points",
     }
-    body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        f"{base_url.rstrip('/')}/query",
-        data=body,
-        headers={"Content-Type": "application/json; charset=utf-8"},
-        method="POST",
-    )
-    with urllib.request.urlopen(req, timeout=240) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+    if params:
+        payload.update(params)
+    return payload
+
+
+def call_query(base_url: str, question: str, project: str, mode: str, params: dict | None = None) -> dict:
+    return get_client(base_url).query(build_query_payload(question, project, mode, params))
+
+
+def summarize_ref_projects(resp: dict, project: str, min_target_hits: int) -> dict:
+    """Count target/foreign references and apply the strict pass criterion."""
+    refs = resp.get("references") or []
+    ref_projects = [canonical_project_name(str(r.get("file_path") or "")) for r in refs]
+    ref_projects = [p for p in ref_projects if p]
+    ref_counts: dict[str, int] = {}
+    for p in ref_projects:
+        ref_counts[p] = ref_counts.get(p, 0) + 1
+    dominant = max(ref_counts, key=ref_counts.get) if ref_counts else "없음"
+    target_hits = ref_counts.get(project, 0)
+    foreign_hits = sum(v for k, v in ref_counts.items() if k != project)
+    # strict criteria: dominant must match target and target evidence must exist
+    return {
+        "ref_projects": ref_projects,
+        "dominant": dominant,
+        "target_hits": target_hits,
+        "foreign_hits": foreign_hits,
+        "passed": target_hits >= min_target_hits and dominant == project,
+    }
 
 
 def summarize_answer(text: str, limit: int = 180) -> str:
@@ -104,6 +163,52 @@ def summarize_answer(text: str, limit: int = 180) -> str:
     return s or "응답 없음"
 
 
+def summarize_rows(rows: list[dict]) -> dict:
+    total = len(rows)
+    strict_pass = sum(1 for r in rows if r["result"] == "P")
+    pass_rate = strict_pass / total if total else 0.0
+    return {
+        "total": total,
+        "pass": strict_pass,
+        "fail": total - strict_pass,
+        "pass_rate": round(pass_rate, 4),
+        "final": "PASS" if pass_rate >= 0.8 else "FAIL",
+    }
+
+
+def render_report(run: dict, rows: list[dict]) -> str:
+    """Render the strict-query markdown from one stored run (see eval_store)."""
+    summary = summarize_rows(rows)
+    projects = run["params"]["projects"]
+    out = []
+    out.append("# LightRAG 프로젝트별 엄격 질의 결과")
+    out.append("")
+    out.append("엄격 기준")
+    out.append("- 질의는 프로젝트명을 강제 포함하여 실행")
+    out.append(f"- 참조문헌 기준 대상 프로젝트 hit >= {run['params']['min_target_hits']}")
+    out.append("- 참조문헌 최다 프로젝트(dominant)가 대상 프로젝트와 일치해야 통과")
+    out.append("- 외부 프로젝트 참조가 있어도 dominant가 대상이면 통과(제약: API 문서필터 부재)")
+    out.append("- 답변 외부엔티티: 다른 프로젝트에만 있는 엔티티가 답변에 나온 경우(참고, 판정 미반영)")
+    out.append("")
+    out.append(f"- 프로젝트 수: {len(projects)} ({', '.join(projects)})")
+    out.append(f"- 총 평가 건수: {summary['total']} (10문항 x {len(projects)}프로젝트)")
+    out.append(f"- 통과: {summary['pass']}")
+    out.append(f"- 실패: {summary['fail']}")
+    out.append(f"- 통과율: {summary['pass_rate']:.1%}")
+    out.append(f"- 최종 판정: {summary['final']}")
+    out.append("")
+    out.append("| No | 대상 프로젝트 | 질문 | 응답 요약 | 대상참조수 | 외부참조수 | dominant 프로젝트 | 참조 프로젝트 목록 | 답변 외부엔티티 | 판정 |")
+    out.append("|---:|---|---|---|---:|---:|---|---|---|---|")
+    for r in rows:
+        out.append(
+            f"| {r['no']} | {r['project']} | {r['question']} | {r['summary']} | "
+            f"{r['target_hits']} | {r['foreign_hits']} | {r['dominant']} | {r['refs']} | "
+            f"{r.get('foreign_entities') or '-'} | {r['result']} |"
+        )
+    out.append("")
+    return "\n".join(out)
+
+
 def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--quality-md", required=True, type=Path)
@@ -111,7 +216,19 @@ def main() -> int:
     parser.add_argument("--base-url", default="http://127.0.0.1:9700")
     parser.add_argument("--mode", default="local", choices=["local", "hybrid", "mix", "global", "naive", "bypass"])
     parser.add_argument("--min-target-hits", type=int, default=1)
+    parser.add_argument(
+        "--preset",
+        choices=sorted(RETRIEVAL_PRESETS),
+        help="Apply a README retrieval preset (overrides --mode).",
+    )
+    parser.add_argument("--db", type=Path, default=eval_store.DEFAULT_DB, help="eval_store results database.")
+    parser.add_argument("--entity-dictionary", type=Path, default=Path("entity_dictionary.json"))
+    add_client_args(parser, initial_timeout=240)
     args = parser.parse_args()
+    client = client_from_args(args)
+    params = RETRIEVAL_PRESETS[args.preset] if args.preset else None
+    if params:
+        args.mode = params["mode"]
 
     questions = extract_questions(args.quality_md.read_text(encoding="utf-8"))
     if len(questions) != 10:
@@ -120,30 +237,24 @@ def main() -> int:
     projects = get_projects(args.base_url)
     if not projects:
         raise RuntimeError("No processed projects found from /documents endpoint.")
+    # Imported here: entity_dictionary itself imports this module.
+    from entity_dictionary import ContaminationDetector, format_hits
 
-    rows = []
-    strict_pass = 0
-    total = 0
+    detector = ContaminationDetector.load(args.entity_dictionary, projects)
 
+    rows = []
     for no, q in questions:
         for project in projects:
-            total += 1
-            resp = call_query(args.base_url, q, project, args.mode)
+            t0 = time.perf_counter()
+            resp = call_query(args.base_url, q, project, args.mode, params)
+            latency = time.perf_counter() - t0
             answer = maybe_repair_mojibake(resp.get("response") or "")
-            refs = resp.get("references") or []
-            ref_projects = [canonical_project_name(str(r.get("file_path") or "")) for r in refs]
-            ref_projects = [p for p in ref_projects if p]
-            ref_counts: dict[str, int] = {}
-            for p in ref_projects:
-                ref_counts[p] = ref_counts.get(p, 0) + 1
-            dominant = max(ref_counts, key=ref_counts.get) if ref_counts else "없음"
-            target_hits = ref_counts.get(project, 0)
-            foreign_hits = sum(v for k, v in ref_counts.items() if k != project)
-
-            # strict criteria: dominant must match target and target evidence must exist
-            is_pass = target_hits >= args.min_target_hits and dominant == project
-            if is_pass:
-                strict_pass += 1
+            attribution = summarize_ref_projects(resp, project, args.min_target_hits)
+            ref_projects = attribution["ref_projects"]
+            dominant = attribution["dominant"]
+            target_hits = attribution["target_hits"]
+            foreign_hits = attribution["foreign_hits"]
+            is_pass = attribution["passed"]
 
             rows.append(
                 {
@@ -155,49 +266,34 @@ def main() -> int:
                     "foreign_hits": foreign_hits,
                     "dominant": dominant,
                     "refs": ", ".join(sorted(set(ref_projects))) if ref_projects else "없음",
+                    "foreign_entities": format_hits(detector.foreign_entities(answer, {project})),
                     "result": "P" if is_pass else "F",
+                    "passed": is_pass,
+                    "latency_sec": round(latency, 3),
                 }
             )
 
-    pass_rate = strict_pass / total if total else 0.0
-    final = "PASS" if pass_rate >= 0.8 else "FAIL"
-
-    out = []
-    out.append("# LightRAG 프로젝트별 엄격 질의 결과")
-    out.append("")
-    out.append("엄격 기준")
-    out.append("- 질의는 프로젝트명을 강제 포함하여 실행")
-    out.append(f"- 참조문헌 기준 대상 프로젝트 hit >= {args.min_target_hits}")
-    out.append("- 참조문헌 최다 프로젝트(dominant)가 대상 프로젝트와 일치해야 통과")
-    out.append("- 외부 프로젝트 참조가 있어도 dominant가 대상이면 통과(제약: API 문서필터 부재)")
-    out.append("")
-    out.append(f"- 프로젝트 수: {len(projects)} ({', '.join(projects)})")
-    out.append(f"- 총 평가 건수: {total} (10문항 x {len(projects)}프로젝트)")
-    out.append(f"- 통과: {strict_pass}")
-    out.append(f"- 실패: {total - strict_pass}")
-    out.append(f"- 통과율: {pass_rate:.1%}")
-    out.append(f"- 최종 판정: {final}")
-    out.append("")
-    out.append("| No | 대상 프로젝트 | 질문 | 응답 요약 | 대상참조수 | 외부참조수 | dominant 프로젝트 | 참조 프로젝트 목록 | 판정 |")
-    out.append("|---:|---|---|---|---:|---:|---|---|---|")
-    for r in rows:
-        out.append(
-            f"| {r['no']} | {r['project']} | {r['question']} | {r['summary']} | "
-            f"{r['target_hits']} | {r['foreign_hits']} | {r['dominant']} | {r['refs']} | {r['result']} |"
-        )
-    out.append("")
-
-    args.output_md.write_text("\n".join(out), encoding="utf-8", newline="\n")
+    conn = eval_store.connect(args.db)
+    run_id = eval_store.record_run(
+        conn,
+        "run_strict_project_queries",
+        rows,
+        mode=args.mode,
+        preset=args.preset,
+        fingerprint=eval_store.index_fingerprint(args.base_url),
+        params={"projects": projects, "min_target_hits": args.min_target_hits, "retrieval": params or {}},
+        summary={**summarize_rows(rows), "query_client": client.stats()},
+    )
+    run = eval_store.load_run(conn, run_id)
+    args.output_md.write_text(render_report(run, eval_store.load_rows(conn, run_id)), encoding="utf-8", newline="\n")
     print(
         json.dumps(
             {
+                "run_id": run_id,
                 "projects": projects,
-                "total": total,
-                "pass": strict_pass,
-                "fail": total - strict_pass,
-                "pass_rate": round(pass_rate, 4),
-                "final": final,
+                **run["summary"],
                 "mode": args.mode,
+                "preset": args.preset,
                 "min_target_hits": args.min_target_hits,
                 "output": str(args.output_md),
             },
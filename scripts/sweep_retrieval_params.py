@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Sweep retrieval parameters and report the latency/quality trade-off.
+
+- Builds a grid (or random sample) over mode, top_k, chunk_top_k,
+  token budgets and rerank
+- Runs every configuration against the 10-question set x processed projects,
+  reusing the strict payload builder from run_strict_project_queries
+- Calls /query concurrently under a shared request-rate budget, through the
+  adaptive-timeout client (query_client) with hedging off, so every request
+  passes the rate limiter and latencies are not shortened by duplicates
+- Scores each row with the strict project criterion
+- Stores each configuration as one eval_store run (preset = matching README
+  preset, if any)
+- Writes a Pareto table of pass rate vs p95 latency vs context size
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import eval_store
+from query_client import add_client_args, get_client, percentile
+from run_strict_project_queries import (
+    RETRIEVAL_PRESETS,
+    call_query,
+    extract_questions,
+    get_projects,
+    summarize_ref_projects,
+)
+from token_estimate import estimate_tokens
+
+SWEEP_FIELDS = (
+    "mode",
+    "top_k",
+    "chunk_top_k",
+    "max_entity_tokens",
+    "max_relation_tokens",
+    "max_total_tokens",
+    "enable_rerank",
+)
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing request starts to at most `rate` per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def parse_list(raw: str, cast):
+    return [cast(v.strip()) for v in raw.split(",") if v.strip()]
+
+
+def parse_bool(raw: str) -> bool:
+    value = raw.lower()
+    if value in ("1", "true", "on", "yes"):
+        return True
+    if value in ("0", "false", "off", "no"):
+        return False
+    raise ValueError(f"Invalid boolean value: {raw}")
+
+
+def build_configs(axes: dict[str, list], search: str, samples: int, seed: int) -> list[dict]:
+    grid = [dict(zip(SWEEP_FIELDS, combo)) for combo in itertools.product(*(axes[f] for f in SWEEP_FIELDS))]
+    # Token budgets larger than the total budget are clipped by the server anyway.
+    grid = [
+        c
+        for c in grid
+        if c["max_entity_tokens"] + c["max_relation_tokens"] < c["max_total_tokens"]
+    ]
+    if search == "random" and samples < len(grid):
+        grid = random.Random(seed).sample(grid, samples)
+    return grid
+
+
+def config_label(config: dict) -> str:
+    return (
+        f"{config['mode']}/k{config['top_k']}/c{config['chunk_top_k']}/"
+        f"e{config['max_entity_tokens']}/r{config['max_relation_tokens']}/"
+        f"t{config['max_total_tokens']}/{'rr' if config['enable_rerank'] else 'norr'}"
+    )
+
+
+def context_tokens(resp: dict) -> int:
+    total = 0
+    for ref in resp.get("references") or []:
+        content = ref.get("content") or ""
+        if isinstance(content, list):
+            content = "\n".join(str(c) for c in content)
+        total += estimate_tokens(str(content))
+    return total
+
+
+def run_one(base_url: str, limiter: RateLimiter, config: dict, no: int, question: str, project: str, min_target_hits: int) -> dict:
+    limiter.acquire()
+    start = time.perf_counter()
+    try:
+        resp = call_query(base_url, question, project, config["mode"], config)
+    except Exception as exc:  # network errors and timeouts count as failed rows
+        return {
+            "label": config_label(config),
+            "no": no,
+            "project": project,
+            "question": question,
+            "latency_sec": time.perf_counter() - start,
+            "passed": False,
+            "context_tokens": 0,
+            "error": str(exc),
+            "timed_out": isinstance(exc, TimeoutError),
+        }
+    latency = time.perf_counter() - start
+    attribution = summarize_ref_projects(resp, project, min_target_hits)
+    return {
+        "label": config_label(config),
+        "no": no,
+        "project": project,
+        "question": question,
+        "latency_sec": latency,
+        "passed": attribution["passed"],
+        "context_tokens": context_tokens(resp),
+        "error": None,
+        "timed_out": False,
+    }
+
+
+def summarize_config(config: dict, rows: list[dict]) -> dict:
+    # A timed-out row ran for its whole timeout; leaving it out would flatter the p95.
+    latencies = [r["latency_sec"] for r in rows if r["error"] is None or r.get("timed_out")]
+    contexts = [r["context_tokens"] for r in rows if r["error"] is None]
+    passed = sum(1 for r in rows if r["passed"])
+    return {
+        "label": config_label(config),
+        "config": config,
+        "rows": len(rows),
+        "errors": sum(1 for r in rows if r["error"] is not None),
+        "timeouts": sum(1 for r in rows if r.get("timed_out")),
+        "pass_rate": passed / len(rows) if rows else 0.0,
+        "p50_latency_sec": percentile(latencies, 50),
+        "p95_latency_sec": percentile(latencies, 95),
+        "mean_context_tokens": sum(contexts) / len(contexts) if contexts else 0.0,
+    }
+
+
+def mark_pareto(summaries: list[dict]) -> None:
+    """Flag configs not dominated on (higher pass rate, lower p95, smaller context)."""
+    for s in summaries:
+        s["pareto"] = not any(
+            o is not s
+            and o["pass_rate"] >= s["pass_rate"]
+            and o["p95_latency_sec"] <= s["p95_latency_sec"]
+            and o["mean_context_tokens"] <= s["mean_context_tokens"]
+            and (
+                o["pass_rate"] > s["pass_rate"]
+                or o["p95_latency_sec"] < s["p95_latency_sec"]
+                or o["mean_context_tokens"] < s["mean_context_tokens"]
+            )
+            for o in summaries
+        )
+
+
+def preset_name(config: dict) -> str:
+    for name, preset in RETRIEVAL_PRESETS.items():
+        if all(config.get(k) == v for k, v in preset.items()):
+            return name
+    return ""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quality-md", required=True, type=Path)
+    parser.add_argument("--output-md", default=Path("LightRAG 검색 파라미터 스윕 결과.md"), type=Path)
+    parser.add_argument("--report-file", default=Path("sweep_report.json"), type=Path)
+    parser.add_argument("--base-url", default="http://127.0.0.1:9700")
+    parser.add_argument("--search", default="grid", choices=["grid", "random"])
+    parser.add_argument("--samples", type=int, default=12, help="Configurations to draw for --search random.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", default="local,hybrid")
+    parser.add_argument("--top-k", default="12,16,20")
+    parser.add_argument("--chunk-top-k", default="10")
+    parser.add_argument("--max-entity-tokens", default="2500,3000")
+    parser.add_argument("--max-relation-tokens", default="2500,3500")
+    parser.add_argument("--max-total-tokens", default="10000,12000,14000")
+    parser.add_argument("--rerank", default="on")
+    parser.add_argument("--projects", default="", help="Comma-separated subset of projects (default: all processed).")
+    parser.add_argument("--questions", default="", help="Comma-separated question numbers (default: all).")
+    parser.add_argument("--min-target-hits", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=1.0, help="Max /query requests started per second.")
+    parser.add_argument("--db", type=Path, default=eval_store.DEFAULT_DB, help="eval_store results database.")
+    add_client_args(parser, hedging=False)
+    args = parser.parse_args()
+    # Hedged duplicates would skip the rate limiter and cut the latencies being compared.
+    client = get_client(args.base_url, initial_timeout=args.initial_timeout, hedge_budget=0)
+
+    questions = extract_questions(args.quality_md.read_text(encoding="utf-8"))
+    if args.questions:
+        wanted = set(parse_list(args.questions, int))
+        questions = [(no, q) for no, q in questions if no in wanted]
+    if not questions:
+        raise RuntimeError("No questions selected.")
+
+    projects = parse_list(args.projects, str) or get_projects(args.base_url)
+    if not projects:
+        raise RuntimeError("No processed projects found from /documents endpoint.")
+
+    axes = {
+        "mode": parse_list(args.modes, str),
+        "top_k": parse_list(args.top_k, int),
+        "chunk_top_k": parse_list(args.chunk_top_k, int),
+        "max_entity_tokens": parse_list(args.max_entity_tokens, int),
+        "max_relation_tokens": parse_list(args.max_relation_tokens, int),
+        "max_total_tokens": parse_list(args.max_total_tokens, int),
+        "enable_rerank": parse_list(args.rerank, parse_bool),
+    }
+    configs = build_configs(axes, args.search, args.samples, args.seed)
+    if not configs:
+        raise RuntimeError("Sweep space is empty (check token budgets).")
+
+    limiter = RateLimiter(args.rate)
+    rows_by_label: dict[str, list[dict]] = {config_label(c): [] for c in configs}
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = [
+            pool.submit(run_one, args.base_url, limiter, config, no, q, project, args.min_target_hits)
+            for config in configs
+            for no, q in questions
+            for project in projects
+        ]
+        for done, fut in enumerate(as_completed(futures), start=1):
+            row = fut.result()
+            rows_by_label[row["label"]].append(row)
+            if done % 10 == 0 or done == len(futures):
+                print(f"[sweep] {done}/{len(futures)} calls", flush=True)
+    elapsed = time.time() - started
+
+    conn = eval_store.connect(args.db)
+    fingerprint = eval_store.index_fingerprint(args.base_url)
+    run_ids = {}
+    for config in configs:
+        rows = sorted(rows_by_label[config_label(config)], key=lambda r: (r["no"], r["project"]))
+        run_ids[config_label(config)] = eval_store.record_run(
+            conn,
+            "sweep_retrieval_params",
+            rows,
+            mode=config["mode"],
+            preset=preset_name(config) or None,
+            fingerprint=fingerprint,
+            params={"config": config, "projects": projects, "min_target_hits": args.min_target_hits},
+            summary=summarize_config(config, rows),
+        )
+
+    summaries = [summarize_config(c, rows_by_label[config_label(c)]) for c in configs]
+    for s in summaries:
+        s["run_id"] = run_ids[s["label"]]
+    mark_pareto(summaries)
+    summaries.sort(key=lambda s: (-s["pass_rate"], s["p95_latency_sec"], s["mean_context_tokens"]))
+
+    out = []
+    out.append("# LightRAG 검색 파라미터 스윕 결과")
+    out.append("")
+    out.append("기준")
+    out.append(f"- 검색 방식: {args.search} ({len(configs)}개 구성)")
+    out.append(f"- 평가 건수/구성: {len(questions)}문항 x {len(projects)}프로젝트")
+    out.append(f"- 통과 기준: 대상 참조 >= {args.min_target_hits}, dominant 프로젝트 = 대상")
+    out.append(f"- 동시 요청: {args.concurrency}, 요청 속도 상한: {args.rate}/s")
+    out.append(f"- 총 소요: {elapsed:.0f}s")
+    out.append("- Pareto(★): 통과율↑, p95 지연↓, 컨텍스트 크기↓ 중 어느 구성에도 지배되지 않음")
+    out.append("- 지연: 헤지(중복 요청) 없이 측정, 타임아웃 건은 타임아웃까지의 시간으로 p50/p95에 포함")
+    out.append("")
+    out.append("| Pareto | 구성 | 프리셋 | 통과율 | p50(s) | p95(s) | 평균 컨텍스트(tokens) | 오류 | 타임아웃 |")
+    out.append("|---|---|---|---:|---:|---:|---:|---:|---:|")
+    for s in summaries:
+        out.append(
+            f"| {'★' if s['pareto'] else ''} | {s['label']} | {preset_name(s['config']) or '-'} | "
+            f"{s['pass_rate']:.1%} | {s['p50_latency_sec']:.2f} | {s['p95_latency_sec']:.2f} | "
+            f"{s['mean_context_tokens']:.0f} | {s['errors']} | {s['timeouts']} |"
+        )
+    out.append("")
+
+    args.output_md.write_text("\n".join(out), encoding="utf-8", newline="\n")
+    report = {
+        "search": args.search,
+        "configs": len(configs),
+        "questions": [no for no, _ in questions],
+        "projects": projects,
+        "elapsed_sec": round(elapsed, 1),
+        "summaries": summaries,
+        "rows": [r for rows in rows_by_label.values() for r in rows],
+        "query_client": client.stats(),
+    }
+    args.report_file.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(
+        json.dumps(
+            {
+                "configs": len(configs),
+                "pareto": [s["label"] for s in summaries if s["pareto"]],
+                "query_client": client.stats(),
+                "output": str(args.output_md),
+            },
+            ensure_ascii=False,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Token estimate shared by the chunking, ingest and sweep scripts.
+
+Uses tiktoken (cl100k_base) when installed. Without it, Hangul syllables
+count as one token each and the remaining characters as four per token.
+tiktoken is looked up once at import, not per call.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    _ENC = None
+else:
+    _ENC = tiktoken.get_encoding("cl100k_base")
+
+HANGUL_RE = re.compile(r"[가-힣]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, otherwise a chars/token heuristic."""
+    if _ENC is not None:
+        return len(_ENC.encode(text))
+    hangul = len(HANGUL_RE.findall(text))
+    return hangul + math.ceil((len(text) - hangul) / 4)
@@ -5,17 +5,33 @@ Validate corpus quality before indexing.
 Fails when:
 - Unicode replacement character exists (U+FFFD)
 - Private Use Area characters remain
+
+UTF-8 files are memory-mapped and scanned as raw bytes (EF BF BD for U+FFFD,
+EE xx xx / EF 80-A3 xx for U+E000-U+F8FF), so multi-GB corpora are not decoded
+into Python strings. Other encodings fall back to decoding, as does a file
+whose hit sits on a line that is not valid UTF-8 (e.g. cp949 after an ASCII
+head). The report lists line/column of the first --max-locations hits per
+file and a histogram of PUA codepoints; --map-template writes the unmapped ones in
+config/pua_replacements.json format, with null values that load_map rejects
+until they are filled in.
 """
 
 from __future__ import annotations
 
 import argparse
 import json
+import mmap
 import re
+from collections import Counter
 from pathlib import Path
 
 PUA_RE = re.compile(r"[\ue000-\uf8ff]")
+ISSUE_RE = re.compile(r"\ufffd|[\ue000-\uf8ff]")
+# UTF-8 encodings of U+FFFD (EF BF BD) and U+E000-U+F8FF (EE 80 80..EF A3 BF).
+ISSUE_BYTES_RE = re.compile(rb"\xef\xbf\xbd|\xee[\x80-\xbf][\x80-\xbf]|\xef[\x80-\xa3][\x80-\xbf]")
+ISSUE_LEAD_BYTES = (b"\xee", b"\xef")
 TARGET_EXTENSIONS = {".txt", ".md", ".csv", ".json"}
+UTF8_SNIFF_BYTES = 1 << 16
 
 
 def read_text_best_effort(path: Path) -> str:
@@ -28,6 +44,116 @@ def read_text_best_effort(path: Path) -> str:
     return raw.decode("utf-8", errors="replace")
 
 
+def count_issues(text: str) -> dict[str, int]:
+    return {
+        "replacement_char_count": text.count("\ufffd"),
+        "pua_count": sum(1 for _ in PUA_RE.finditer(text)),
+    }
+
+
+def looks_utf8(head: bytes) -> bool:
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        # A multi-byte character cut at the sniff boundary is still valid UTF-8.
+        return exc.reason == "unexpected end of data" and exc.start >= len(head) - 3
+    return True
+
+
+def _new_result() -> dict:
+    return {"replacement_char_count": 0, "pua_count": 0, "locations": [], "pua_histogram": Counter()}
+
+
+def _tally(result: dict, char: str, location: dict | None) -> None:
+    if char == "\ufffd":
+        result["replacement_char_count"] += 1
+    else:
+        result["pua_count"] += 1
+        result["pua_histogram"][f"U+{ord(char):04X}"] += 1
+    if location is not None:
+        result["locations"].append(
+            {"kind": "replacement" if char == "\ufffd" else "pua", "codepoint": f"U+{ord(char):04X}", **location}
+        )
+
+
+def iter_issue_bytes(buf):
+    """Yield (offset, 3-byte sequence) of U+FFFD/PUA hits using memchr-speed find()."""
+    nxt = {lead: buf.find(lead) for lead in ISSUE_LEAD_BYTES}
+    while True:
+        pending = [pos for pos in nxt.values() if pos != -1]
+        if not pending:
+            return
+        pos = min(pending)
+        lead = buf[pos : pos + 1]
+        nxt[lead] = buf.find(lead, pos + 1)
+        seq = buf[pos : pos + 3]
+        if ISSUE_BYTES_RE.fullmatch(seq):
+            yield pos, seq
+
+
+def scan_utf8_bytes(buf, max_locations: int) -> dict | None:
+    """Scan a UTF-8 buffer (bytes or mmap) without decoding it; None if a hit is not in UTF-8 text."""
+    result = _new_result()
+    line = 1
+    last = 0
+    checked_end = -1
+    for pos, seq in iter_issue_bytes(buf):
+        if pos >= checked_end:
+            # cp949 hanja (lead byte EE/EF) can look like a PUA sequence past the
+            # sniffed head; only count hits whose line really is UTF-8.
+            line_start = buf.rfind(b"\n", 0, pos) + 1
+            checked_end = buf.find(b"\n", pos)
+            if checked_end == -1:
+                checked_end = len(buf)
+            try:
+                buf[line_start:checked_end].decode("utf-8")
+            except UnicodeDecodeError:
+                return None
+        location = None
+        if len(result["locations"]) < max_locations:
+            line += buf[last:pos].count(b"\n")
+            last = pos
+            line_start = buf.rfind(b"\n", 0, pos) + 1
+            column = len(buf[line_start:pos].decode("utf-8", errors="replace")) + 1
+            location = {"line": line, "column": column, "byte_offset": pos}
+        _tally(result, seq.decode("utf-8"), location)
+    return result
+
+
+def scan_text(text: str, max_locations: int) -> dict:
+    result = _new_result()
+    line = 1
+    last = 0
+    for m in ISSUE_RE.finditer(text):
+        location = None
+        if len(result["locations"]) < max_locations:
+            pos = m.start()
+            line += text.count("\n", last, pos)
+            last = pos
+            location = {"line": line, "column": pos - (text.rfind("\n", 0, pos) + 1) + 1}
+        _tally(result, m.group(), location)
+    return result
+
+
+def scan_file(path: Path, max_locations: int) -> dict:
+    with path.open("rb") as f:
+        if path.stat().st_size == 0:
+            return _new_result()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if looks_utf8(mm[:UTF8_SNIFF_BYTES]):
+                result = scan_utf8_bytes(mm, max_locations)
+                if result is not None:
+                    return result
+    return scan_text(read_text_best_effort(path), max_locations)
+
+
+def load_mapped_chars(path: Path) -> set[str]:
+    if not path.exists():
+        return set()
+    with path.open("r", encoding="utf-8") as f:
+        return {k for k, v in json.load(f).items() if len(k) == 1 and v}
+
+
 def iter_files(root: Path):
     for p in root.rglob("*"):
         if p.is_file() and p.suffix.lower() in TARGET_EXTENSIONS:
@@ -38,31 +164,49 @@ def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--input-dir", required=True, type=Path)
     parser.add_argument("--report-file", type=Path, default=Path("validation_report.json"))
+    parser.add_argument("--max-locations", type=int, default=20, help="Hits per file reported with line/column.")
+    parser.add_argument("--map-file", type=Path, default=Path("config/pua_replacements.json"))
+    parser.add_argument(
+        "--map-template",
+        type=Path,
+        help="Write unmapped PUA codepoints as a replacement-map JSON stub (null values to fill in).",
+    )
     args = parser.parse_args()
 
     if not args.input_dir.exists():
         raise FileNotFoundError(f"Input dir does not exist: {args.input_dir}")
 
     issues: list[dict] = []
+    histogram: Counter = Counter()
     scanned = 0
     for path in iter_files(args.input_dir):
         scanned += 1
-        text = read_text_best_effort(path)
-        repl_count = text.count("\ufffd")
-        pua_count = len(PUA_RE.findall(text))
-        if repl_count or pua_count:
+        result = scan_file(path, args.max_locations)
+        if result["replacement_char_count"] or result["pua_count"]:
+            histogram.update(result["pua_histogram"])
             issues.append(
                 {
                     "path": str(path),
-                    "replacement_char_count": repl_count,
-                    "pua_count": pua_count,
+                    "replacement_char_count": result["replacement_char_count"],
+                    "pua_count": result["pua_count"],
+                    "pua_histogram": dict(result["pua_histogram"].most_common()),
+                    "locations": result["locations"],
                 }
             )
 
+    mapped = load_mapped_chars(args.map_file)
+    unmapped = [cp for cp, _ in histogram.most_common() if chr(int(cp[2:], 16)) not in mapped]
+    if args.map_template:
+        # load_map refuses null values, so an unfilled stub cannot be merged by accident.
+        template = {chr(int(cp[2:], 16)): None for cp in unmapped}
+        args.map_template.write_text(json.dumps(template, ensure_ascii=True, indent=2), encoding="utf-8")
+
     report = {
         "input_dir": str(args.input_dir),
         "files_scanned": scanned,
         "issue_count": len(issues),
+        "pua_histogram": dict(histogram.most_common()),
+        "unmapped_pua": unmapped,
         "issues": issues,
     }
     args.report_file.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
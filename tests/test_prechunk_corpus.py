@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from prechunk_corpus import chunk_text, is_heading, parse_blocks  # noqa: E402
+
+CAPTION = "표 3.2 부재별 재료 강도"
+HEADER = "부재  fck(MPa)  fy(MPa)"
+ROWS = [f"C{i}  {24 + i}  400" for i in range(1, 41)]
+TABLE_TEXT = "\n".join(["3.2 재료 강도", "", "설계에 적용한 재료 강도는 다음과 같다.", CAPTION, HEADER, *ROWS])
+
+
+def test_text_header_and_caption_belong_to_table():
+    blocks = parse_blocks(TABLE_TEXT)
+    assert [b.kind for b in blocks] == ["heading", "text", "table"]
+    assert blocks[1].lines == ["설계에 적용한 재료 강도는 다음과 같다."]
+    table = blocks[2]
+    assert table.lines[:3] == [CAPTION, HEADER, ROWS[0]]
+    assert table.head_rows == 2
+
+
+def test_split_table_repeats_caption_and_header_not_data_rows():
+    chunks, _ = chunk_text(TABLE_TEXT, max_tokens=120)
+    table_chunks = [c for c in chunks if c.has_table]
+    assert len(table_chunks) > 1
+    seen = []
+    for chunk in table_chunks:
+        lines = chunk.text.split("\n")
+        start = lines.index(CAPTION)
+        assert lines[start + 1] == HEADER
+        seen.extend(line for line in lines[start + 2 :])
+    assert seen == ROWS
+
+
+def test_header_separated_by_blank_line():
+    blocks = parse_blocks("\n".join([CAPTION, HEADER, "", *ROWS[:3]]))
+    assert [b.kind for b in blocks] == ["table"]
+    assert blocks[0].head_rows == 2
+
+
+def test_numeric_table_without_header_repeats_only_caption():
+    blocks = parse_blocks("\n".join([CAPTION, *ROWS]))
+    assert blocks[0].head_rows == 1
+
+
+def test_headings():
+    assert is_heading("1 개요")
+    assert is_heading("3.2.1 해석 결과")
+    assert is_heading("제 2 장 구조 계획")
+    assert not is_heading("3.5 MPa 이상으로 설계되었다")
+    assert not is_heading("1 2 3")
+    assert not is_heading("2 3.5 4.0 kN")
@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from validate_corpus import scan_file  # noqa: E402
+
+
+def test_cp949_after_ascii_head_is_not_pua(tmp_path):
+    # 低 is EE F0 in cp949; with a Hangul lead byte after it, it looks like UTF-8 PUA bytes.
+    path = tmp_path / "cp949.txt"
+    path.write_bytes(b"x" * 70000 + "低가\n".encode("cp949"))
+    result = scan_file(path, max_locations=5)
+    assert result["pua_count"] == 0
+    assert result["replacement_char_count"] == 0
+
+
+def test_utf8_pua_is_counted(tmp_path):
+    path = tmp_path / "utf8.txt"
+    path.write_text("x" * 70000 + "\n강도  값\n", encoding="utf-8")
+    result = scan_file(path, max_locations=5)
+    assert result["pua_count"] == 1
+    assert result["pua_histogram"] == {"U+E039": 1}
+    assert result["locations"][0]["line"] == 2